@@ -1 +1,6 @@
-from .compiler import Compiler
+def __getattr__(name):
+	#imported on first use, so entry points that don't compile, like c2logic-client, start quickly
+	if name == "Compiler":
+		from .compiler import Compiler
+		return Compiler
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,144 @@
+import glob
+import os
+import time
+from dataclasses import dataclass, field
+
+from .cache import Cache
+from .compiler import Compiler
+from .stats import Stats
+
+@dataclass
+class Result():
+	filename: str
+	output: str
+	error: str = None
+	instructions: int = 0
+	#files the output depends on, used by watch
+	deps: set = field(default_factory=set)
+	stats: Stats = None
+	#instructions of the programs of other processors, see processor_path
+	processors: dict = field(default_factory=dict)
+
+def expand(patterns):
+	""" filenames matching the glob patterns, patterns without matches are kept as is """
+	filenames = []
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else []
+		for filename in matches or [pattern]:
+			if filename not in filenames:
+				filenames.append(filename)
+	return filenames
+
+def output_paths(filenames, output_dir=None):
+	"""
+	the .mlog file to write each file's output to, which is next to the source by default
+	with output_dir, the directory structure below the sources' common directory is kept
+	"""
+	paths = {}
+	if output_dir is not None and filenames:
+		root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in filenames])
+	for filename in filenames:
+		path = os.path.splitext(filename)[0] + ".mlog"
+		if output_dir is not None:
+			path = os.path.join(output_dir, os.path.relpath(os.path.abspath(path), root))
+		paths[filename] = path
+	return paths
+
+def processor_path(path, processor):
+	""" where the program of a processor other than the main one goes, next to path """
+	root, ext = os.path.splitext(path)
+	return f"{root}.{processor}{ext or '.mlog'}"
+
+def compile_file(filename, output, use_cache=True, **options):
+	""" compile filename to output, options are passed to Compiler """
+	cache = Cache() if use_cache else None
+	compiler = Compiler(cache=cache, **options)
+	deps = {os.path.abspath(filename)}
+	try:
+		code = compiler.compile(filename)
+	except Exception as e:  #pylint: disable=broad-except
+		#one broken file shouldn't stop the rest of the batch
+		return Result(filename, output, error=f"{type(e).__name__}: {e}", deps=deps)
+	if cache is not None:
+		deps |= cache.deps.get(os.path.abspath(filename), set())
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, "w") as f:
+		print(code, file=f)
+	processors = {}
+	for processor, program in compiler.programs.items():
+		if processor != "main":
+			with open(processor_path(output, processor), "w") as f:
+				print(program, file=f)
+			processors[processor] = len(program.splitlines())
+	return Result(
+		filename,
+		output,
+		instructions=len(code.splitlines()),
+		deps=deps,
+		stats=compiler.stats,
+		processors=processors
+	)
+
+def compile_files(filenames, output_dir=None, executor=None, **options):
+	""" compile every file, across executor's processes if given, and return their Results """
+	outputs = output_paths(filenames, output_dir)
+	if executor is None:
+		return [compile_file(filename, outputs[filename], **options) for filename in filenames]
+	futures = [
+		executor.submit(compile_file, filename, outputs[filename], **options)
+		for filename in filenames
+	]
+	return [future.result() for future in futures]
+
+def summary(results, show_stats=False, max_instructions=1000):
+	lines = []
+	for result in results:
+		if show_stats and result.stats is not None:
+			lines.append(f"{result.filename}:")
+			lines.append(result.stats.report(max_instructions))
+		if result.error is None:
+			line = f"{result.filename} -> {result.output} ({result.instructions} instructions)"
+			if result.instructions > max_instructions:
+				line += f", over the limit of {max_instructions}"
+			lines.append(line)
+			if result.stats is not None:
+				lines.extend(f"  warning: {warning}" for warning in result.stats.warnings)
+			for processor, instructions in result.processors.items():
+				path = processor_path(result.output, processor)
+				lines.append(f"  {processor} -> {path} ({instructions} instructions)")
+		else:
+			lines.append(f"{result.filename}: {result.error}")
+	failed = sum(result.error is not None for result in results)
+	lines.append(f"compiled {len(results) - failed} of {len(results)} files")
+	return "\n".join(lines)
+
+def get_mtime(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except OSError:
+		return None
+
+def watch(patterns, output_dir=None, executor=None, interval=1.0, show_stats=False, **options):
+	""" recompile files whenever they or a header they include change, until interrupted """
+	deps = {}
+	mtimes = {}
+	while True:
+		filenames = expand(patterns)
+		changed = [
+			filename for filename in filenames if filename not in deps or
+			any(get_mtime(path) != mtimes.get(path) for path in deps[filename])
+		]
+		if changed:
+			#modification times are taken before compiling so edits made meanwhile aren't missed
+			before = {
+				path: get_mtime(path)
+				for filename in changed
+				for path in deps.get(filename, ())
+			}
+			results = compile_files(changed, output_dir, executor, **options)
+			for result in results:
+				deps[result.filename] = result.deps | deps.get(result.filename, set())
+				for path in result.deps:
+					mtimes[path] = before.get(path, get_mtime(path))
+			print(summary(results, show_stats, options.get("max_instructions", 1000)), flush=True)
+		time.sleep(interval)
@@ -0,0 +1,214 @@
+import glob
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from .compiler import Compiler, opt_levels, parse_opt_level
+
+#programs of the synthetic corpus, each scaling one of function count, nesting depth and expression
+#size from a small base program
+base_shape = {"functions": 4, "depth": 2, "expression_size": 4}
+corpus_shapes = {}
+for dimension, sizes in (("functions", (16, 64)), ("depth", (4, 8)), ("expression_size", (16, 64))):
+	for size in sizes:
+		corpus_shapes[f"{dimension}_{size}"] = {**base_shape, dimension: size}
+
+def synthetic_expression(size, depth):
+	""" an expression of size terms mixing the arguments, the result so far and the loop counters """
+	terms = ["a", "b", "x"] + [f"i{level}" for level in range(depth)]
+	ops = ["+", "*", "-", "/"]
+	expression = "x"
+	for i in range(1, size):
+		expression = f"({expression} {ops[i % len(ops)]} {terms[i % len(terms)]} + {i})"
+	return expression
+
+def synthetic_function(index, depth, expression_size):
+	lines = [f"double f{index}(double a, double b) {{", "\tdouble x = a;"]
+	lines += [f"\tint i{level};" for level in range(depth)]
+	indent = "\t"
+	for level in range(depth):
+		lines.append(f"{indent}for (i{level} = 0; i{level} < 2; i{level}++) {{")
+		indent += "\t"
+		lines.append(f"{indent}if (x > b) {{")
+		lines.append(f"{indent}\tx = {synthetic_expression(expression_size, level + 1)};")
+		lines.append(f"{indent}}} else {{")
+		lines.append(f"{indent}\tx = x + i{level};")
+		lines.append(f"{indent}}}")
+	for level in reversed(range(depth)):
+		indent = indent[:-1]
+		lines.append(f"{indent}}}")
+	lines += ["\treturn x;", "}"]
+	return lines
+
+def synthetic_program(functions, depth, expression_size):
+	""" C source with functions that each nest depth loops and compute expressions of that size """
+	lines = ['#include "c2logic/builtins.h"', "extern struct MindustryObject message1;"]
+	for i in range(functions):
+		lines += synthetic_function(i, depth, expression_size)
+	lines.append("void main(void) {")
+	lines.append("\tdouble total = 0;")
+	for i in range(functions):
+		lines.append(f"\ttotal += f{i}(total, {i});")
+	lines += ["\tprint(total);", "\tprintflush(message1);", "}"]
+	return "\n".join(lines) + "\n"
+
+def write_corpus(directory):
+	""" write the synthetic corpus to directory, returns the paths of its programs """
+	paths = []
+	for name, shape in corpus_shapes.items():
+		path = os.path.join(directory, name + ".c")
+		with open(path, "w") as f:
+			f.write(synthetic_program(**shape))
+		paths.append(path)
+	return paths
+
+def count_opcodes(function):
+	counts = {"instructions": len(function.instructions), "set": 0, "jump": 0}
+	for instruction in function.instructions:
+		if instruction.opcode in ("set", "jump"):
+			counts[instruction.opcode] += 1
+	return counts
+
+def measure(filename, repeat=3, **options):
+	"""
+	compile filename with options, returns the fastest of repeat compile times in ms, the peak
+	memory allocated during a separate compile, the size of the output and that of each function
+	"""
+	times = []
+	for _ in range(repeat):
+		compiler = Compiler(**options)
+		start = time.perf_counter()
+		code = compiler.compile(filename)
+		times.append(time.perf_counter() - start)
+	#tracing allocations slows down the compile, so it isn't timed
+	tracemalloc.start()
+	try:
+		Compiler(**options).compile(filename)
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	functions = {name: count_opcodes(function) for name, function in compiler.functions.items()}
+	return {
+		"time": round(min(times) * 1000, 1),
+		"peak_memory": peak,
+		"instructions": len(code.splitlines()),
+		"functions": functions
+	}
+
+def run(filenames, levels, repeat=3, **options):
+	""" {name: {level: results of measure}} for each file at each -O level """
+	results = {}
+	for filename in filenames:
+		results[name_of(filename)] = {
+			str(level): measure(filename, repeat, opt_level=level, **options)
+			for level in levels
+		}
+	return results
+
+def name_of(filename):
+	""" files are keyed by path relative to the working directory, or by name if outside it """
+	path = os.path.relpath(filename)
+	return os.path.basename(path) if path.startswith("..") else path.replace(os.sep, "/")
+
+def compare(results, baseline, tolerance=None):
+	"""
+	differences from baseline as lines of text and whether any of them is a regression
+	instruction counts regress if they grow at all, compile times if they grow by more than tolerance
+	times depend on the machine, so they're only compared when tolerance is given
+	"""
+	lines = []
+	regressed = False
+	for name, levels in results.items():
+		for level, result in levels.items():
+			old = baseline.get(name, {}).get(level)
+			if old is None:
+				lines.append(f"{name} -O{level}: new")
+				continue
+			if result["instructions"] != old["instructions"]:
+				lines.append(
+					f"{name} -O{level}: {old['instructions']} -> {result['instructions']} "
+					"instructions"
+				)
+				regressed |= result["instructions"] > old["instructions"]
+			if tolerance is not None and result["time"] > old["time"] * (1 + tolerance):
+				lines.append(f"{name} -O{level}: {old['time']} -> {result['time']} ms")
+				regressed = True
+	return lines, regressed
+
+def report(results):
+	lines = [f"{'file':<40} {'O':>2} {'ms':>9} {'peak KiB':>9} {'instructions':>12}"]
+	for name, levels in results.items():
+		for level, result in levels.items():
+			lines.append(
+				f"{name:<40} {level:>2} {result['time']:>9.1f} {result['peak_memory'] // 1024:>9} "
+				f"{result['instructions']:>12}"
+			)
+	return "\n".join(lines)
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(
+		description="Measure compile time, memory and output size of examples and a synthetic "
+		"corpus."
+	)
+	parser.add_argument(
+		"files",
+		nargs="*",
+		default=["examples/*.c"],
+		help="C sources or glob patterns to compile besides the synthetic corpus"
+	)
+	parser.add_argument(
+		"-O",
+		"--optimization-level",
+		type=parse_opt_level,
+		nargs="+",
+		choices=opt_levels,
+		default=[0, 1, 2, 3]
+	)
+	parser.add_argument("--repeat", type=int, default=3, help="compiles to take the fastest of")
+	parser.add_argument(
+		"--preprocessor",
+		choices=["cpp", "builtin"],
+		default="builtin",
+		help="builtin makes results independent of the installed cpp"
+	)
+	parser.add_argument("--no-corpus", action="store_true", help="skip the synthetic corpus")
+	parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+	parser.add_argument(
+		"--baseline",
+		metavar="PATH",
+		help="compare with a saved baseline, exiting with 1 if the output grew"
+	)
+	parser.add_argument(
+		"--tolerance",
+		type=float,
+		help="also exit with 1 if a compile got slower by more than this fraction, only meaningful "
+		"with a baseline saved on the same machine"
+	)
+	args = parser.parse_args()
+	filenames = []
+	for pattern in args.files:
+		filenames += sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+	with tempfile.TemporaryDirectory() as directory:
+		if not args.no_corpus:
+			filenames += write_corpus(directory)
+		results = run(
+			filenames, args.optimization_level, args.repeat, preprocessor=args.preprocessor
+		)
+	print(report(results))
+	if args.save is not None:
+		with open(args.save, "w") as f:
+			json.dump(results, f, indent="\t", sort_keys=True)
+			f.write("\n")
+	if args.baseline is not None:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		lines, regressed = compare(results, baseline, args.tolerance)
+		print("\n".join(lines) or "no changes from the baseline")
+		if regressed:
+			raise SystemExit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+import re
+
+import pycparser
+from pycparser import c_parser
+
+from .preprocessor import preprocessors
+from .stats import Stats
+
+#cpp line markers, such as # 1 "builtins.h" 1
+line_marker_re = re.compile(r'^#\s*(?:line\s+)?\d+\s+"((?:[^"\\]|\\.)*)"', re.MULTILINE)
+
+def get_cache_dir():
+	if os.name == "nt":
+		base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+	else:
+		base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+	return os.path.join(base, "c2logic")
+
+parser = None
+
+def get_parser():
+	""" the CParser shared by every parse, as creating one loads pycparser's tables """
+	global parser  #pylint: disable=global-statement
+	if parser is None:
+		parser = c_parser.CParser()
+	return parser
+
+def file_digest(path):
+	with open(path, "rb") as f:
+		return hashlib.sha256(f.read()).hexdigest()
+
+def dependencies(text):
+	""" files read by cpp to produce the preprocessed text """
+	paths = set()
+	for match in line_marker_re.finditer(text):
+		path = match.group(1).replace("\\\\", "\\")
+		if os.path.isfile(path):
+			paths.add(os.path.abspath(path))
+	return paths
+
+class Cache():
+	"""
+	on-disk cache of preprocessed and parsed C files
+	entries are keyed on the source, the cpp args and the pycparser version, and are only used if
+	none of the files included while preprocessing have changed since
+	"""
+	def __init__(self, path=None, max_size=64 * 2**20):
+		self.path = path or get_cache_dir()
+		#least recently used entries are evicted once the cache is bigger than this many bytes
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		#files each parsed file was preprocessed from, by absolute path
+		self.deps = {}
+	
+	def key(self, filename, cpp_args, preprocessor):
+		digest = hashlib.sha256()
+		for part in (pycparser.__version__, preprocessor, os.path.abspath(filename), *cpp_args):
+			digest.update(part.encode() + b"\0")
+		with open(filename, "rb") as f:
+			digest.update(f.read())
+		return digest.hexdigest()
+	
+	def parse_file(self, filename, cpp_args, preprocessor="cpp", stats=None):
+		"""
+		equivalent to pycparser.parse_file(filename, use_cpp=True, cpp_args=cpp_args)
+		preprocessor is a key of preprocessors, the time taken is added to stats if given
+		"""
+		stats = stats or Stats()
+		with stats.time("cache lookup"):
+			key = self.key(filename, cpp_args, preprocessor)
+			entry_path = os.path.join(self.path, key + ".pickle")
+			entry = self.load(entry_path)
+		if entry is not None:
+			self.hits += 1
+		else:
+			self.misses += 1
+			with stats.time("preprocess"):
+				text = preprocessors[preprocessor](filename, cpp_args=cpp_args)
+			with stats.time("parse"):
+				ast = get_parser().parse(text, filename)
+			with stats.time("cache store"):
+				deps = {path: file_digest(path) for path in dependencies(text)}
+				entry = {"deps": deps, "text": text, "ast": ast}
+				self.store(entry_path, entry)
+		self.deps[os.path.abspath(filename)] = set(entry["deps"])
+		return entry["ast"]
+	
+	def load(self, entry_path):
+		try:
+			with open(entry_path, "rb") as f:
+				entry = pickle.load(f)
+			for path, digest in entry["deps"].items():
+				if file_digest(path) != digest:
+					return None
+			os.utime(entry_path)
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError):
+			#missing, corrupt or from an incompatible version
+			return None
+		return entry
+	
+	def store(self, entry_path, entry):
+		#write to a temporary file first so concurrent compiles never read a partial entry
+		tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+		try:
+			os.makedirs(self.path, exist_ok=True)
+			with open(tmp_path, "wb") as f:
+				pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp_path, entry_path)
+		except (OSError, pickle.PicklingError, RecursionError):
+			#the cache is only an optimization, so failing to write it isn't an error
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			return
+		self.evict()
+	
+	def evict(self):
+		entries = []
+		with os.scandir(self.path) as it:
+			for dir_entry in it:
+				if dir_entry.name.endswith(".pickle"):
+					stat = dir_entry.stat()
+					entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:  # evicted by another process
+				pass
+			total -= size
@@ -0,0 +1,22 @@
+import os
+import sys
+
+from .server import request
+
+def main():
+	""" c2logic, run by a c2logic-server if one is running and in this process otherwise """
+	args = sys.argv[1:]
+	try:
+		response = request(args, os.getcwd())
+	except OSError:  # no server
+		response = None
+	if response is None:
+		from .compiler import main as compile_main
+		compile_main(args)
+		return
+	sys.stdout.write(response["stdout"])
+	sys.stderr.write(response["stderr"])
+	raise SystemExit(response["status"])
+
+if __name__ == "__main__":
+	main()
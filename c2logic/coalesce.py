@@ -0,0 +1,114 @@
+from .flow import defs, is_retaddr, is_temp, liveness, local_names, param_names, rename
+from .instructions import RawAsm, Set
+
+class Group():
+	def __init__(self, var, fixed, across_calls):
+		self.members = [var]
+		self.fixed = var if fixed else None
+		self.across_calls = across_calls
+		self.interference = set()
+
+def coalesce(function):
+	"""
+	rename non-interfering locals and temporaries onto the same variable
+	returns whether anything was renamed
+	"""
+	instructions = function.instructions
+	if not instructions or any(isinstance(instruction, RawAsm) for instruction in instructions):
+		return False
+	private = local_names(function)
+	params = param_names(function)
+	temps = set()
+	for instruction in instructions:
+		temps |= {var for var in defs(instruction) if is_temp(var)}
+	live_in, live_out = liveness(function, private | temps)
+	#locals read before being written keep their value between calls
+	entry_live = live_in[0] - params
+	across_calls = set()
+	for instruction in instructions:
+		if is_retaddr(instruction) and instruction.src < len(instructions):
+			across_calls |= live_in[instruction.src]
+	#temporaries live across calls may be clobbered by the callee, so they can only absorb others
+	candidates = ((private - params) | (temps - across_calls)) - entry_live
+	fixed = (params | (temps & across_calls)) - entry_live
+	groups = {
+		var: Group(var, var in fixed, var in across_calls and var not in fixed)
+		for var in sorted(candidates | fixed)
+	}
+	
+	for i, instruction in enumerate(instructions):
+		for dest in defs(instruction):
+			if dest not in groups:
+				continue
+			for var in live_out[i]:
+				if var == dest or var not in groups:
+					continue
+				if isinstance(instruction, Set) and instruction.src == var:
+					continue
+				groups[dest].interference.add(var)
+				groups[var].interference.add(dest)
+	
+	leaders = {var: var for var in groups}
+	
+	def find(var):
+		while leaders[var] != var:
+			var = leaders[var]
+		return var
+	
+	def try_merge(a, b):
+		a, b = find(a), find(b)
+		if a == b:
+			return False
+		group_a, group_b = groups[a], groups[b]
+		if group_a.fixed is not None and group_b.fixed is not None:
+			return False
+		if group_a.interference & set(group_b.members):
+			return False
+		fixed_var = group_a.fixed or group_b.fixed
+		#values that live across calls must stay in function private variables
+		if group_a.across_calls or group_b.across_calls:
+			if fixed_var is not None and is_temp(fixed_var):
+				return False
+		if group_b.fixed is not None:
+			a, b = b, a
+			group_a, group_b = group_b, group_a
+		leaders[b] = a
+		group_a.members.extend(group_b.members)
+		group_a.interference |= group_b.interference
+		group_a.across_calls |= group_b.across_calls
+		return True
+	
+	#coalesce copies first as that removes instructions
+	for instruction in instructions:
+		if isinstance(instruction, Set) and {instruction.dest, instruction.src} <= groups.keys():
+			try_merge(instruction.dest, instruction.src)
+	#then pack the remaining variables to use fewer names
+	seen = []
+	for var in groups:
+		leader = find(var)
+		if leader != var:
+			continue
+		for other in seen:
+			if try_merge(other, var):
+				break
+		else:
+			seen.append(var)
+	
+	mapping = {}
+	for var, group in groups.items():
+		if find(var) != var or len(group.members) == 1:
+			continue
+		if group.fixed is not None:
+			name = group.fixed
+		elif group.across_calls:
+			name = min(member for member in group.members if member in private)
+		else:
+			name = min(group.members, key=lambda member: (not is_temp(member), member))
+		for member in group.members:
+			if member != name:
+				mapping[member] = name
+	if not mapping:
+		return False
+	for instruction in instructions:
+		rename(instruction, mapping)
+	return True
@@ -1,17 +1,37 @@
 import os
+import sys
 import sysconfig
+import copy
 import dataclasses
 from dataclasses import dataclass
 
-from pycparser import c_ast, parse_file
+from pycparser import c_ast
 from pycparser.c_ast import (
-	Compound, Constant, DeclList, Enum, FileAST, FuncDecl, Struct, TypeDecl, Typename
+	ID, ArrayDecl, ArrayRef, Case, Compound, Constant, Default, DeclList, Enum, FileAST, FuncCall,
+	FuncDecl, InitList, Struct, TypeDecl, Typename
 )
 
-from .consts import builtins, draw_funcs, func_binary_ops, func_unary_ops
+from . import mlog, peephole
+from .cache import Cache, get_parser
+from .preprocessor import preprocessors
+from .profile import Profile
+from .stats import Stats
+from .coalesce import coalesce
+from .cse import eliminate_common_subexpressions, sensor_policies
+from .graphics import remove_redundant_draw_state, split_draw_batches
+from .layout import layout_blocks
+from .linker import format_source_map, link, source_map
+from .inline import inline_functions
+from .outline import outline
+from .propagate import (
+	fold_binary_op, fold_condition, fold_unary_op, format_literal, literal_value,
+	propagate_constants, remove_dead_stores
+)
+from .consts import binary_op_inverses, builtins, draw_funcs, func_binary_ops, func_unary_ops
 from .instructions import (
-	BinaryOp, Draw, DrawFlush, Enable, End, FunctionCall, GetLink, Goto, Instruction, JumpCondition,
-	Print, PrintFlush, Radar, RawAsm, Read, RelativeJump, Return, Sensor, Set, Shoot, UnaryOp, Write
+	BinaryOp, ComputedJump, Draw, DrawFlush, Enable, End, FunctionCall, GetLink, Goto, Instruction,
+	JumpCondition, Print, PrintFlush, Radar, Read, RelativeJump, Return, Sensor, Set, Shoot,
+	UnaryOp, Write
 )
 
 @dataclass
@@ -25,14 +45,35 @@ class Function():
 	callees: set = dataclasses.field(init=False, default_factory=set)
 	callers: set = dataclasses.field(init=False, default_factory=set)
 	labels: dict = dataclasses.field(init=False, default_factory=dict)
+	#pycparser Coord of the definition
+	coord: object = dataclasses.field(default=None, init=False)
 	
 	def __post_init__(self):
 		self.locals = self.params[:]
 
+@dataclass
+class Array():
+	size: int
+	#variables holding each element, or None if the array is in memory
+	elements: list = None
+	#memory cell or bank holding the array, and the position of its first element in it
+	memory: str = None
+	offset: int = None
+
+@dataclass
+class Remote():
+	""" a function that runs on another processor, called through shared memory """
+	processor: str
+	params: list
+	returns: bool
+	#position of the call's flag in shared memory, followed by the return value and arguments
+	address: int
+
 @dataclass
 class Loop():
 	start: int
 	end_jumps: list = dataclasses.field(default_factory=list)
+	continue_jumps: list = dataclasses.field(default_factory=list)
 
 """
 @dataclass
@@ -42,8 +83,49 @@ class Variable():
 """
 
 class Compiler(c_ast.NodeVisitor):
-	def __init__(self, opt_level=0):
-		self.opt_level = opt_level
+	def __init__(
+		self,
+		opt_level=0,
+		inline_threshold=10,
+		max_instructions=1000,
+		cache=None,
+		preprocessor="cpp",
+		array_threshold=8,
+		array_memory="cell1",
+		array_memory_size=64,
+		instrument=None,
+		profile=None,
+		max_unroll_size=64,
+		shared_memory="cell3",
+		shared_memory_size=64,
+		sensor_policy="block"
+	):
+		#"s" runs every -O4 pass but prefers smaller code to faster code
+		self.optimize_size = opt_level == "s"
+		self.opt_level = 4 if self.optimize_size else opt_level
+		#functions with at most this many instructions are inlined at every call site
+		self.inline_threshold = inline_threshold
+		#inlining won't grow the program past this
+		self.max_instructions = max_instructions
+		#a Cache to reuse parsed files from, or None to always run cpp and parse
+		self.cache = cache
+		#"cpp" to run the system C preprocessor or "builtin" to use c2logic.preprocessor
+		self.preprocessor = preprocessor
+		#arrays with at most this many elements are stored in variables, others in array_memory
+		self.array_threshold = array_threshold
+		self.array_memory = array_memory
+		self.array_memory_size = array_memory_size
+		#memory cell or bank the probes of an instrumented build count in, or None
+		self.instrument = instrument
+		#a Profile from an instrumented build to guide optimizations, or None
+		self.profile = profile
+		#hot loops with a constant trip count are unrolled if that takes at most this many instructions
+		self.max_unroll_size = max_unroll_size
+		#memory cell or bank linked to every processor, for globals they share and calls between them
+		self.shared_memory = shared_memory
+		self.shared_memory_size = shared_memory_size
+		#see cse.sensor_policies
+		self.sensor_policy = sensor_policy
 		self.functions: dict = None
 		self.curr_function: Function = None
 		self.globals: list = None
@@ -51,6 +133,28 @@ class Compiler(c_ast.NodeVisitor):
 		self.loops: list = None
 		self.loop_end: int = None
 		self.special_vars: dict = None
+		self.arrays: dict = None
+		self.array_offset: int = None
+		#keys of the probes of an instrumented build, by their position in memory
+		self.probes: list = None
+		#the key of each function's entry probe
+		self.entry_probes: dict = None
+		#functions after #pragma processor, which run on other processors
+		self.remotes: dict = None
+		#globals used on several processors, as Arrays of size 1 in shared memory
+		self.shared: dict = None
+		self.shared_names: set = None
+		self.shared_offset: int = None
+		#the function each program starts at
+		self.entry: str = None
+		#the code for each processor of the last compile, "main" is the one running main
+		self.programs: dict = None
+		#Stats of the last compile
+		self.stats: Stats = None
+		#position in the C source of the node being compiled, given to the instructions pushed
+		self.coord = None
+		#the function and source position of each line of each program of the last compile
+		self.source_maps: dict = None
 	
 	def compile(self, filename: str):
 		self.functions = {}
@@ -59,75 +163,311 @@ class Compiler(c_ast.NodeVisitor):
 		self.loops = []
 		self.loop_end = None
 		self.special_vars = {}
-		ast = parse_file(filename, use_cpp=True, cpp_args=["-I", get_include_path()])
-		self.visit(ast)
-		#remove uncalled functions
+		self.arrays = {}
+		self.array_offset = 0
+		self.probes = []
+		self.entry_probes = {}
+		self.shared = {}
+		self.programs = {}
+		self.source_maps = {}
+		self.coord = None
+		self.stats = stats = Stats()
+		ast = self.parse(filename)
+		with stats.time("codegen"):
+			self.find_processors(ast)
+			self.visit(ast)
+			for processor in self.get_processors():
+				self.push_dispatcher(processor)
+		stats.record_all(self.functions, "codegen")
+		functions = self.functions
+		entries = {processor: f"__serve_{processor}" for processor in self.get_processors()}
+		#main is compiled last, so stats and functions are left with its program
+		entries["main"] = "main"
+		for processor, entry in entries.items():
+			self.entry = entry
+			if len(entries) > 1:
+				self.functions = get_program(functions, entry)
+			self.optimize_program()
+			preamble = self.get_preamble()
+			with stats.time("link"):
+				lines = link(self.functions, preamble)
+			self.source_maps[processor] = source_map(self.functions, preamble)
+			with stats.time("emit"):
+				self.programs[processor] = "\n".join(lines)
+		stats.instructions = len(lines)
+		return self.programs["main"]
+	
+	def optimize_program(self):
+		stats = self.stats
+		if self.optimize_size:
+			#how much inlining shrinks a function depends on what can be folded into it afterwards,
+			#so compile with and without inlining functions that aren't obviously smaller inlined
+			functions = self.functions
+			codegen_sizes = stats.sizes
+			warnings = stats.warnings
+			candidates = []
+			for shrink_only in (False, True):
+				self.functions = copy.deepcopy(functions)
+				stats.sizes = copy.deepcopy(codegen_sizes)
+				stats.warnings = list(warnings)
+				self.run_passes(shrink_only)
+				size = sum(len(function.instructions) for function in self.functions.values())
+				candidates.append((size, self.functions, stats.sizes, stats.warnings))
+			_, self.functions, stats.sizes, stats.warnings = min(
+				candidates, key=lambda candidate: candidate[0]
+			)
+		else:
+			self.run_passes()
+	
+	def run_passes(self, shrink_only=False):
+		""" run the optimizations after codegen, shrink_only only inlines what shrinks the program """
+		stats = self.stats
 		if self.opt_level >= 2:
-			self.functions["main"].callers.add("__start")
-			self.remove_uncalled_funcs()
+			self.functions[self.entry].callers.add("__start")
+			hot, cold = self.get_profiled_functions()
+			with stats.time("inline"):
+				inline_functions(
+					self.functions, self.inline_threshold, self.max_instructions, shrink_only, hot,
+					cold, self.entry
+				)
+			stats.record_all(self.functions, "inline")
+			#remove uncalled functions
+			with stats.time("remove uncalled functions"):
+				self.remove_uncalled_funcs()
+		if self.opt_level >= 4:
+			with stats.time("optimize"):
+				for function in self.functions.values():
+					self.optimize_function(function)
+			#the entry is placed first, so the program starts in it without a call
+			self.functions = {self.entry: self.functions[self.entry], **self.functions}
+		if self.opt_level >= 1:
+			with stats.time("split draw batches"):
+				stats.warnings += split_draw_batches(self.functions)
+		if self.optimize_size:
+			with stats.time("outline"):
+				outline(self.functions, lambda name: Function(name, []))
+			stats.record_all(self.functions, "outline")
+	
+	def get_profiled_functions(self):
+		""" functions called more than once per run of main, and ones that weren't called at all """
+		if self.profile is None:
+			return set(), set()
+		hot = {name for name, key in self.entry_probes.items() if self.profile.is_hot(key)}
+		cold = {name for name, key in self.entry_probes.items() if self.profile.get(key) == 0}
+		return hot, cold
+	
+	def find_processors(self, ast):
+		"""
+		find the functions following #pragma processor NAME, which run on processor NAME, and the
+		globals used by several processors, which are kept in shared memory
+		accesses to those globals don't wait for calls to void functions, which run in parallel
+		"""
+		self.remotes = {}
+		funcdefs = {}
+		processor = None
+		address = 0
+		for node in ast.ext:
+			if isinstance(node, c_ast.Pragma) and node.string.split()[:1] == ["processor"]:
+				if len(node.string.split()) != 2:
+					raise ValueError("Expected #pragma processor NAME", node)
+				processor = node.string.split()[1]
+			elif isinstance(node, c_ast.FuncDef):
+				name = node.decl.name
+				funcdefs[name] = node
+				if processor is None:
+					continue
+				if name == "main" or processor == "main":
+					raise ValueError("main always runs on the main processor", node)
+				func_decl = node.decl.type
+				if func_decl.args is None or isinstance(func_decl.args.params[0], Typename):
+					params = []
+				else:
+					params = [param_decl.name for param_decl in func_decl.args.params]
+				return_type = func_decl.type.type
+				returns = not (
+					isinstance(return_type, c_ast.IdentifierType) and return_type.names == ["void"]
+				)
+				self.remotes[name] = Remote(processor, params, returns, address)
+				address += 2 + len(params)
+				processor = None
+		self.shared_names = set()
+		self.shared_offset = address
+		if not self.remotes:
+			return
+		calls = {
+			name:
+			{
+			child.name.name
+			for child in walk(node.body)
+			if isinstance(child, FuncCall) and isinstance(child.name, ID)
+			}
+			for name, node in funcdefs.items()
+		}
+		users = {}
+		for processor in ["main"] + self.get_processors():
+			if processor == "main":
+				roots = ["main"]
+			else:
+				roots = [
+					name for name, remote in self.remotes.items() if remote.processor == processor
+				]
+			#functions running on processor, calls to other processors don't run the callee here
+			reached = set(roots)
+			worklist = list(roots)
+			while worklist:
+				caller = worklist.pop()
+				for callee in calls[caller]:
+					if callee in self.remotes:
+						if self.remotes[callee].processor == processor:
+							#the processor would wait for itself to finish the call
+							raise ValueError(
+								f"{caller} runs on {processor}, so it can't call {callee}"
+							)
+					elif callee in funcdefs and callee not in reached:
+						reached.add(callee)
+						worklist.append(callee)
+			for name in reached:
+				for var in referenced_names(funcdefs[name].body):
+					users.setdefault(var, set()).add(processor)
+		for node in ast.ext:
+			if isinstance(node, c_ast.Decl) and isinstance(node.type, (TypeDecl, ArrayDecl)):
+				if len(users.get(node.name, ())) > 1:
+					self.shared_names.add(node.name)
+	
+	def get_processors(self):
+		""" processors other than the main one, in order of their first function """
+		processors = []
+		for remote in self.remotes.values():
+			if remote.processor not in processors:
+				processors.append(remote.processor)
+		return processors
+	
+	def alloc_shared(self, name, size):
+		if self.shared_offset + size > self.shared_memory_size:
+			raise ValueError(f"Not enough space in {self.shared_memory} for {name}")
+		array = Array(size, memory=self.shared_memory, offset=self.shared_offset)
+		self.shared_offset += size
+		return array
+	
+	def push_dispatcher(self, processor):
+		""" create the function a processor runs, which runs its functions whenever they're called """
+		self.curr_function = Function(f"__serve_{processor}", [])
+		memory = self.shared_memory
+		for name, remote in self.remotes.items():
+			if remote.processor != processor:
+				continue
+			flag = self.get_special_var("__flag")
+			self.push(Read(flag, memory, str(remote.address)))
+			self.push(RelativeJump(None, JumpCondition("==", flag, "0")))
+			self.delete_special_var(flag)
+			skip_jump = self.curr_offset()
+			for i, param in enumerate(remote.params):
+				self.push(Read(f"_{param}_{name}", memory, str(remote.address + 2 + i)))
+			self.push(Set("__retaddr_" + name, self.curr_offset() + 3))
+			self.push(FunctionCall(name))
+			if remote.returns:
+				self.push(Write("__rax", memory, str(remote.address + 1)))
+			#the call is done, so the caller can read the return value or call again
+			self.push(Write("0", memory, str(remote.address)))
+			self.patch_jumps([skip_jump])
+			self.curr_function.callees.add(name)
+			self.functions[name].callers.add(self.curr_function.name)
+		self.push(RelativeJump(0, JumpCondition.always))
+		self.functions[self.curr_function.name] = self.curr_function
+		self.curr_function = None
+	
+	def push_wait(self, remote):
+		""" wait until the processor running remote is done with the last call to it """
+		flag = self.get_special_var("__flag")
+		self.push(Read(flag, self.shared_memory, str(remote.address)))
+		self.push(RelativeJump(self.curr_offset(), JumpCondition("!=", flag, "0")))
+		self.delete_special_var(flag)
+	
+	def push_remote_call(self, name, args):
+		"""
+		call a function running on another processor, which continues without waiting for it to
+		return unless it returns a value
+		shared globals aren't synchronized, so the caller can read them before a void call writes them
+		"""
+		remote = self.remotes[name]
+		memory = self.shared_memory
+		self.push_wait(remote)
+		for i, arg in enumerate(args):
+			self.visit(arg)
+			self.push(Write(self.get_unary_arg(), memory, str(remote.address + 2 + i)))
+		self.push(Write("1", memory, str(remote.address)))
+		if remote.returns:
+			self.push_wait(remote)
+			self.push(Read("__rax", memory, str(remote.address + 1)))
+	
+	def get_preamble(self):
+		if self.entry != "main":
+			#dispatchers are placed first and never return
+			return []
 		init_call = FunctionCall("main")
 		if self.opt_level >= 3:
-			if len(self.functions) == 1:
-				preamble = []
+			if next(iter(self.functions)) == "main":
+				#main is placed first, so it starts without a call
+				return []
 			else:
-				preamble = [init_call]
+				return [init_call]
 		else:
-			preamble = [Set("__retaddr_main", "2"), init_call, End()]
-		
-		offset = len(preamble)
-		
-		#set function starts
-		for function in self.functions.values():
-			function.start = offset
-			offset += len(function.instructions)
-		
-		#rewrite relative jumps and func calls
-		init_call.func_start = self.functions["main"].start
-		for function in self.functions.values():
-			instructions = function.instructions
-			for instruction in instructions:
-				if isinstance(instruction, RelativeJump):
-					instruction.func_start = function.start
-				elif isinstance(instruction, FunctionCall):
-					instruction.func_start = self.functions[instruction.func_name].start
-				elif isinstance(instruction, Goto):
-					instruction.offset = function.labels[instruction.label]
-					instruction.func_start = function.start
-				elif isinstance(instruction, Set) and instruction.dest.startswith("__retaddr"):
-					instruction.src += function.start
-		out = []
-		if preamble:
-			out.append("\n".join(map(str, preamble)))
-		out.extend(
-			"\n".join(map(str, function.instructions)) for function in self.functions.values()
-		)
-		return "\n".join(out)
+			return [Set("__retaddr_main", "2"), init_call, End()]
+	
+	def parse(self, filename):
+		cpp_args = ["-I", get_include_path()]
+		if self.cache is not None:
+			return self.cache.parse_file(filename, cpp_args, self.preprocessor, self.stats)
+		with self.stats.time("preprocess"):
+			text = preprocessors[self.preprocessor](filename, cpp_args=cpp_args)
+		with self.stats.time("parse"):
+			return get_parser().parse(text, filename)
+	
+	def optimize_function(self, function):
+		while propagate_constants(function):
+			pass
+		self.stats.record(function, "propagate")
+		eliminate_common_subexpressions(function, self.sensor_policy)
+		self.stats.record(function, "cse")
+		remove_dead_stores(function)
+		self.stats.record(function, "dead stores")
+		remove_redundant_draw_state(function)
+		self.stats.record(function, "draw state")
+		peephole.optimize(function)
+		self.stats.record(function, "peephole")
+		if coalesce(function):
+			peephole.optimize(function)
+		self.stats.record(function, "coalesce")
+		if not self.optimize_size:
+			if layout_blocks(function):
+				peephole.optimize(function)
+			self.stats.record(function, "layout")
 	
 	def remove_uncalled_funcs(self):
-		to_remove = set()
-		for name, function in list(self.functions.items()):
-			if name in to_remove:
-				continue
-			callers = set()
-			if not self.is_called(function, callers):
-				to_remove.add(name)
-				to_remove |= callers
-		for name in to_remove:
-			del self.functions[name]
-	
-	def is_called(self, function, callers):
-		if function.name in callers:  #avoid infinite loops
-			return False
-		for func_name in function.callers:
-			if func_name == "__start":
-				return True
-			callers.add(function.name)
-			if self.is_called(self.functions[func_name], callers):
-				return True
-		return False
+		""" remove functions that can't be reached from the entry through the call graph """
+		called = {self.entry}
+		worklist = [self.entry]
+		while worklist:
+			for callee in self.functions[worklist.pop()].callees:
+				if callee not in called and callee in self.functions:
+					called.add(callee)
+					worklist.append(callee)
+		for name in list(self.functions):
+			if name not in called:
+				del self.functions[name]
 	
 	#utilities
+	def visit(self, node):
+		#instructions come from the innermost node being compiled that has a position
+		coord = self.coord
+		if node is not None and node.coord is not None:
+			self.coord = node.coord
+		result = super().visit(node)
+		self.coord = coord
+		return result
+	
 	def push(self, instruction: Instruction):
+		instruction.coord = self.coord
 		self.curr_function.instructions.append(instruction)
 	
 	def pop(self):
@@ -167,39 +507,152 @@ class Compiler(c_ast.NodeVisitor):
 			pass
 	
 	def can_avoid_indirection(self, var="__rax"):
+		""" whether the value of var can be read from the set at the top, which is then popped """
 		top = self.peek()
-		return self.opt_level >= 1 and isinstance(top, Set) and top.dest == var
+		if self.opt_level >= 1 and isinstance(top, Set) and top.dest == var:
+			self.stats.indirections_avoided += 1
+			return True
+		return False
 	
 	def set_to_rax(self, varname: str):
 		top = self.peek()
-		if self.opt_level >= 1 and hasattr(top, "dest") and top.dest == "__rax":
+		if self.opt_level >= 1 and "dest" in top.dests and top.dest == "__rax":
 			#avoid indirection through __rax
 			self.curr_function.instructions[-1].dest = varname
+			self.stats.indirections_avoided += 1
 		else:
 			self.push(Set(varname, "__rax"))
 	
-	def push_body_jump(self):
-		""" jump over loop/if body when cond is false """
-		if self.opt_level >= 1 and isinstance(self.peek(), BinaryOp):
-			try:
-				self.push(RelativeJump(None, JumpCondition.from_binaryop(self.pop().inverse())))
-			except KeyError:
-				self.push(RelativeJump(None, JumpCondition("==", "__rax", "0")))
+	def probe_key(self, node, kind):
+		return f"{self.curr_function.name}:{node.coord.line}:{node.coord.column}:{kind}"
+	
+	def push_probe(self, node, kind):
+		""" count how many times this point runs in an instrumented build """
+		if self.instrument is None:
+			return
+		key = self.probe_key(node, kind)
+		if key not in self.probes:
+			self.probes.append(key)
+		index = str(self.probes.index(key))
+		count = self.get_special_var("__probe")
+		self.push(Read(count, self.instrument, index))
+		self.push(BinaryOp(count, count, "1", "+"))
+		self.push(Write(count, self.instrument, index))
+		self.delete_special_var(count)
+	
+	def is_hotter(self, node, kind, other_kind):
+		""" whether the profile shows the probe of kind ran more than the one of other_kind """
+		if self.profile is None:
+			return False
+		count = self.profile.get(self.probe_key(node, kind))
+		other_count = self.profile.get(self.probe_key(node, other_kind))
+		return count is not None and other_count is not None and count > other_count
+	
+	def is_comparison(self, instruction):
+		return isinstance(instruction, BinaryOp) and instruction.op in binary_op_inverses
+	
+	def push_binary_op(self, left, right, op):
+		folded = fold_binary_op(op, left, right) if self.opt_level >= 1 else None
+		if folded is None:
+			self.push(BinaryOp("__rax", left, right, op))
+		else:
+			self.push(Set("__rax", folded))
+	
+	def push_unary_op(self, src, op):
+		folded = fold_unary_op(op, src) if self.opt_level >= 1 else None
+		if folded is None:
+			self.push(UnaryOp("__rax", src, op))
 		else:
-			self.push(RelativeJump(None, JumpCondition("==", "__rax", "0")))
+			self.push(Set("__rax", folded))
 	
-	def start_loop(self, cond):
-		self.loops.append(Loop(self.curr_offset() + 1))
+	def push_cond_jumps(self, cond, jump_if: bool):
+		"""
+		jump when cond is jump_if and fall through otherwise, && and || are short circuited
+		returns the offsets of the jumps, whose targets are filled in by the caller
+		"""
+		if cond is None:  #for(;;)
+			return self.push_cond_jump(JumpCondition.always, True) if jump_if else []
+		if isinstance(cond, c_ast.BinaryOp) and cond.op in ("&&", "||"):
+			if (cond.op == "||") == jump_if:
+				#either side alone decides the jump
+				jumps = self.push_cond_jumps(cond.left, jump_if)
+				return jumps + self.push_cond_jumps(cond.right, jump_if)
+			#the right side is skipped when the left side already decides the result
+			skip_jumps = self.push_cond_jumps(cond.left, not jump_if)
+			jumps = self.push_cond_jumps(cond.right, jump_if)
+			self.patch_jumps(skip_jumps)
+			return jumps
+		if isinstance(cond, c_ast.UnaryOp) and cond.op == "!" and self.opt_level >= 1:
+			return self.push_cond_jumps(cond.expr, not jump_if)
+		if is_expect(cond):
+			expr, expected = cond.args.exprs
+			jumps = self.push_cond_jumps(expr, jump_if)
+			self.hint_jumps(jumps, bool(constant_value(expected)) == jump_if)
+			return jumps
 		self.visit(cond)
-		self.push_body_jump()
-		self.loops[-1].end_jumps = [self.curr_offset()]  # also used for breaks
+		if self.opt_level >= 1 and self.is_comparison(self.peek()):
+			return self.push_cond_jump(JumpCondition.from_binaryop(self.pop()), jump_if)
+		return self.push_cond_jump(JumpCondition("!=", self.get_unary_arg(), "0"), jump_if)
+	
+	def push_cond_jump(self, cond: JumpCondition, jump_if: bool):
+		if not jump_if:
+			cond = JumpCondition(binary_op_inverses[cond.op], cond.left, cond.right)
+		taken = fold_condition(cond) if self.opt_level >= 1 else None
+		if taken is False:
+			return []
+		elif taken:
+			cond = JumpCondition.always
+		self.push(RelativeJump(None, cond))
+		return [self.curr_offset()]
+	
+	def hint_jumps(self, offsets, likely: bool):
+		""" mark the jumps at offsets as likely to be taken or not, unless they already are """
+		for offset in offsets:
+			jump = self.curr_function.instructions[offset]
+			if jump.likely is None:
+				jump.likely = likely
+	
+	def push_logical_op(self, node):
+		""" store the 1 or 0 result of && or || in __rax """
+		result = self.get_special_var("__logic")
+		self.push(Set(result, "0"))
+		jumps = self.push_cond_jumps(node, False)
+		self.push(Set(result, "1"))
+		#the jumps land on the read of result, so fusing it into the next instruction is safe
+		self.patch_jumps(jumps)
+		self.push(Set("__rax", result))
+		self.delete_special_var(result)
+	
+	def push_loop(self, node, cond, body, next_expr=None):
+		loop = Loop(self.curr_offset() + 1)
+		self.loops.append(loop)
+		loop.end_jumps = self.push_cond_jumps(cond, False)  # also used for breaks
+		body_start = self.curr_offset() + 1
+		self.push_probe(node, "body")
+		self.visit(body)
+		self.patch_jumps(loop.continue_jumps)
+		if next_expr is not None:
+			self.visit(next_expr)
+		if self.opt_level >= 1:
+			#test the condition again at the bottom, so each iteration only runs one jump
+			back_start = self.curr_offset() + 1
+			self.push_back_jumps(cond, body_start)
+			if self.optimize_size and self.curr_offset() + 1 - back_start > 1:
+				#jumping back to the test at the top is smaller than a copy of the condition
+				del self.curr_function.instructions[back_start:]
+				self.push(RelativeJump(loop.start, JumpCondition.always))
+		else:
+			self.push(RelativeJump(loop.start, JumpCondition.always))
+		self.end_loop()
+	
+	def push_back_jumps(self, cond, target):
+		for offset in self.push_cond_jumps(cond, True):
+			self.curr_function.instructions[offset].offset = target
 	
 	def end_loop(self):
 		loop = self.loops.pop()
-		self.push(RelativeJump(loop.start, JumpCondition.always))
 		self.loop_end = self.curr_offset() + 1
-		for offset in loop.end_jumps:
-			self.curr_function.instructions[offset].offset = self.loop_end
+		self.patch_jumps(loop.end_jumps)
 	
 	def push_ret(self):
 		#TODO make retaddr and local variables use get_special_var and delete_special_var
@@ -211,6 +664,32 @@ class Compiler(c_ast.NodeVisitor):
 		else:
 			self.push(Return(self.curr_function.name))
 	
+	def is_self_call(self, node):
+		if not isinstance(node, FuncCall) or not isinstance(node.name, ID):
+			return False
+		return node.name.name == self.curr_function.name
+	
+	def push_self_tail_call(self, node):
+		""" reassign the parameters and jump to the start instead of overwriting __retaddr """
+		func = self.curr_function
+		args = node.args.exprs if node.args is not None else []
+		arg_names = [referenced_names(arg) for arg in args]
+		temps = []
+		for i, (param, arg) in enumerate(zip(func.params, args)):
+			self.visit(arg)
+			#params read by later args are only assigned once all args are evaluated
+			if any(param in names for names in arg_names[i + 1:]):
+				temp = self.get_special_var("__tailcall")
+				self.set_to_rax(temp)
+				temps.append((param, temp))
+			else:
+				self.set_to_rax(f"_{param}_{func.name}")
+		for param, temp in temps:
+			self.push(Set(f"_{param}_{func.name}", temp))
+		for _, temp in reversed(temps):
+			self.delete_special_var(temp)
+		self.push(RelativeJump(0, JumpCondition.always))
+	
 	def optimize_builtin_args(self, args):
 		if self.opt_level >= 1:
 			for i, arg in reversed(list(enumerate(args))):
@@ -221,13 +700,16 @@ class Compiler(c_ast.NodeVisitor):
 					break
 		return args
 	
-	def get_unary_builtin_arg(self, args):
-		self.visit(args[0])
+	def get_unary_arg(self):
 		if self.can_avoid_indirection():
 			return self.pop().src
 		else:
 			return "__rax"
 	
+	def get_unary_builtin_arg(self, args):
+		self.visit(args[0])
+		return self.get_unary_arg()
+	
 	def get_binary_builtin_args(self, args, name):
 		left_name = self.get_special_var(f"__{name}_arg0")
 		self.visit(args[0])
@@ -264,6 +746,9 @@ class Compiler(c_ast.NodeVisitor):
 			else:
 				params = [param_decl.name for param_decl in func_decl.args.params]
 			self.curr_function = Function(func_name, params)
+		self.curr_function.coord = node.decl.coord
+		self.entry_probes[func_name] = self.probe_key(node, "entry")
+		self.push_probe(node, "entry")
 		self.visit(node.body)
 		#implicit return
 		#needed if loop/if body is at end of function or hasn't returned yet
@@ -279,12 +764,16 @@ class Compiler(c_ast.NodeVisitor):
 			varname = node.name
 			if self.curr_function is None:  # globals
 				self.globals.append(varname)
+				if varname in self.shared_names:
+					self.shared[varname] = self.alloc_shared(varname, 1)
 			else:
 				self.curr_function.locals.append(varname)
 				varname = f"_{varname}_{self.curr_function.name}"
 			if node.init is not None:
 				self.visit(node.init)
 				self.set_to_rax(varname)
+		elif isinstance(node.type, ArrayDecl):
+			self.declare_array(node)
 		elif isinstance(node.type, FuncDecl):
 			if node.name not in builtins + func_unary_ops + func_binary_ops:
 				#create placeholder function for forward declarations
@@ -304,7 +793,176 @@ class Compiler(c_ast.NodeVisitor):
 		else:
 			raise NotImplementedError(node)
 	
+	def declare_array(self, node):
+		array_decl = node.type
+		if not isinstance(array_decl.type, TypeDecl):
+			raise NotImplementedError("Multidimensional arrays", node)
+		if node.init is not None and not isinstance(node.init, InitList):
+			raise NotImplementedError("Array initializer that isn't a list", node)
+		inits = node.init.exprs if node.init is not None else []
+		if array_decl.dim is not None:
+			size = constant_value(array_decl.dim)
+		else:
+			size = len(inits)
+		if size != int(size) or size <= 0:
+			raise ValueError("Array size must be a positive integer", node)
+		if len(inits) > size:
+			raise ValueError("Too many initializers", node)
+		size = int(size)
+		if self.curr_function is None and node.name in self.shared_names:
+			names = []
+			array = self.alloc_shared(node.name, size)
+		elif size <= self.array_threshold:
+			#each element is a variable named like a.0
+			names = [f"{node.name}.{i}" for i in range(size)]
+			array = Array(size, names)
+		else:
+			if self.array_offset + size > self.array_memory_size:
+				raise ValueError(f"Not enough space in {self.array_memory} for {node.name}", node)
+			names = []
+			array = Array(size, memory=self.array_memory, offset=self.array_offset)
+			self.array_offset += size
+		if self.curr_function is None:  # globals
+			if inits:
+				raise NotImplementedError("Initialized global arrays", node)
+			self.globals.extend([node.name] + names)
+			self.arrays[node.name] = array
+			return
+		self.curr_function.locals.extend([node.name] + names)
+		if array.elements is not None:
+			array.elements = [self.get_varname(name) for name in names]
+		self.arrays[self.get_varname(node.name)] = array
+		if inits:
+			inits = inits + [None] * (size - len(inits))
+		for i, init in enumerate(inits):
+			#elements without an initializer are zeroed, like in C
+			if init is None:
+				self.push(Set("__rax", "0"))
+			else:
+				self.visit(init)
+			self.push_store(array, str(i), self.get_unary_arg())
+	
+	def get_array(self, node):
+		if not isinstance(node, ID):
+			raise NotImplementedError(node)
+		varname = self.get_varname(node.name)
+		if varname not in self.arrays:
+			raise TypeError(f"{node.name} is not an array", node)
+		return self.arrays[varname]
+	
+	def get_constant_index(self, node, array):
+		try:
+			index = constant_value(node)
+		except TypeError:
+			return None
+		if index != int(index) or not 0 <= index < array.size:
+			raise IndexError(f"Index {format_literal(index)} is out of bounds", node)
+		return int(index)
+	
+	def get_subscript(self, node, array):
+		""" the index as a literal or in a new __subscript variable, evaluated before anything else """
+		index = self.get_constant_index(node, array)
+		if index is not None:
+			return str(index)
+		self.visit(node)
+		subscript = self.get_special_var("__subscript")
+		self.set_to_rax(subscript)
+		return subscript
+	
+	def push_element_table(self, array, index, make_entry):
+		""" run make_entry(element) for the element at index through a jump table on @counter """
+		#each entry is the instruction from make_entry and a jump past the table
+		offset = self.get_special_var("__table")
+		self.push(BinaryOp(offset, index, "2", "*"))
+		self.push(ComputedJump(offset, 2 * array.size - 1))
+		self.delete_special_var(offset)
+		end_jumps = []
+		for i, element in enumerate(array.elements):
+			self.push(make_entry(element))
+			if i != array.size - 1:
+				self.push(RelativeJump(None, JumpCondition.always))
+				end_jumps.append(self.curr_offset())
+		self.patch_jumps(end_jumps)
+	
+	def get_address(self, array, index):
+		if literal_value(index) is not None:
+			return format_literal(array.offset + literal_value(index))
+		elif array.offset == 0:
+			return index
+		address = self.get_special_var("__address")
+		self.push(BinaryOp(address, index, str(array.offset), "+"))
+		self.delete_special_var(address)
+		return address
+	
+	def push_load(self, array, index):
+		""" load the element at index into __rax """
+		if array.elements is None:
+			self.push(Read("__rax", array.memory, self.get_address(array, index)))
+		elif literal_value(index) is not None:
+			self.push(Set("__rax", array.elements[int(literal_value(index))]))
+		else:
+			#the table sets element rather than __rax, as only the last instruction that sets __rax
+			#may be rewritten to avoid indirection
+			element = self.get_special_var("__element")
+			self.push_element_table(array, index, lambda var: Set(element, var))
+			self.push(Set("__rax", element))
+			self.delete_special_var(element)
+	
+	def push_store(self, array, index, value):
+		""" store value in the element at index """
+		if array.elements is None:
+			self.push(Write(value, array.memory, self.get_address(array, index)))
+		elif literal_value(index) is not None:
+			self.push(Set(array.elements[int(literal_value(index))], value))
+		else:
+			self.push_element_table(array, index, lambda var: Set(var, value))
+	
+	def assign_element(self, node, op):
+		""" assign to an array element, op is the operator of augmented assignments or None for = """
+		lvalue = node.lvalue if isinstance(node, c_ast.Assignment) else node.expr
+		if isinstance(lvalue, ArrayRef):
+			array = self.get_array(lvalue.name)
+			index = self.get_subscript(lvalue.subscript, array)
+		else:  # shared global
+			array = self.shared[self.get_varname(lvalue.name)]
+			index = "0"
+		if isinstance(node, c_ast.Assignment):
+			self.visit(node.rvalue)
+		else:
+			self.push(Set("__rax", "1"))
+		value = self.get_unary_arg()
+		if op is not None:
+			#loading the element overwrites __rax
+			result = self.get_special_var("__element")
+			if value == "__rax":
+				self.push(Set(result, value))
+				value = result
+			self.push_load(array, index)
+			self.push(BinaryOp(result, "__rax", value, op))
+			self.push_store(array, index, result)
+			if self.opt_level < 3:
+				self.push(Set("__rax", result))
+			self.delete_special_var(result)
+		else:
+			self.push_store(array, index, value)
+		self.delete_special_var(index)
+	
+	def visit_ArrayRef(self, node):
+		array = self.get_array(node.name)
+		index = self.get_subscript(node.subscript, array)
+		self.push_load(array, index)
+		self.delete_special_var(index)
+	
+	def is_in_memory(self, node):
+		""" whether node is an array element or shared global, which are assigned to by assign_element """
+		if isinstance(node, ArrayRef):
+			return True
+		return isinstance(node, ID) and self.get_varname(node.name) in self.shared
+	
 	def visit_Assignment(self, node):
+		if self.is_in_memory(node.lvalue):
+			self.assign_element(node, None if node.op == "=" else node.op[:-1])
+			return
 		self.visit(node.rvalue)
 		varname = self.get_varname(node.lvalue.name)
 		if node.op == "=":  #normal assignment
@@ -325,11 +983,19 @@ class Compiler(c_ast.NodeVisitor):
 		varname = node.name
 		if varname not in self.functions:
 			varname = self.get_varname(varname)
+			if varname in self.arrays:
+				raise TypeError("Arrays can only be indexed", node)
+			if varname in self.shared:
+				self.push_load(self.shared[varname], "0")
+				return
 		if varname in ("links", "ipt", "counter", "time"):
 			varname = "@" + varname
 		self.push(Set("__rax", varname))
 	
 	def visit_BinaryOp(self, node):
+		if node.op in ("&&", "||"):
+			self.push_logical_op(node)
+			return
 		self.visit(node.left)
 		left = self.get_special_var("__rbx")
 		self.set_to_rax(left)
@@ -340,11 +1006,16 @@ class Compiler(c_ast.NodeVisitor):
 		if self.can_avoid_indirection(left):
 			self.delete_special_var(left)
 			left = self.pop().src
-		self.push(BinaryOp("__rax", left, right, node.op))
+		self.push_binary_op(left, right, node.op)
 		self.delete_special_var(left)
 	
 	def visit_UnaryOp(self, node):
-		if node.op == "p++" or node.op == "p--":  #postincrement/decrement
+		if node.op in ("p++", "p--", "++", "--") and self.is_in_memory(node.expr):
+			self.assign_element(node, node.op[-1])
+			if node.op[0] == "p" and self.opt_level < 3:
+				#the value before the postincrement/decrement
+				self.push(BinaryOp("__rax", "__rax", "1", "-" if node.op[-1] == "+" else "+"))
+		elif node.op == "p++" or node.op == "p--":  #postincrement/decrement
 			varname = self.get_varname(node.expr.name)
 			if self.opt_level < 3:
 				self.push(Set("__rax", varname))
@@ -356,68 +1027,241 @@ class Compiler(c_ast.NodeVisitor):
 				self.push(Set("__rax", varname))
 		elif node.op == "!":
 			self.visit(node.expr)
-			if self.opt_level >= 1 and isinstance(self.peek(), BinaryOp):
-				try:
-					self.push(self.pop().inverse())
-				except KeyError:
-					self.push(BinaryOp("__rax", "__rax", "0", "=="))
+			if self.opt_level >= 1 and self.is_comparison(self.peek()):
+				self.push(self.pop().inverse())
 			else:
-				self.push(BinaryOp("__rax", "__rax", "0", "=="))
+				self.push_binary_op(self.get_unary_arg(), "0", "==")
 		else:
 			self.visit(node.expr)
-			self.push(UnaryOp("__rax", "__rax", node.op))
+			self.push_unary_op(self.get_unary_arg(), node.op)
 	
 	def visit_For(self, node):
-		self.visit(node.init)
-		self.start_loop(node.cond)
-		self.visit(node.stmt)  # loop body
-		self.visit(node.next)
-		self.end_loop()
+		if node.init is not None:
+			self.visit(node.init)
+		#unrolling trades size for speed
+		if self.profile is not None and not self.optimize_size and self.profile.is_hot(
+			self.probe_key(node, "body")
+		):
+			trip_count = self.get_trip_count(node)
+			if trip_count is not None and self.push_unrolled_loop(node, trip_count):
+				return
+		self.push_loop(node, node.cond, node.stmt, node.next)
+	
+	def get_trip_count(self, node):
+		"""
+		iterations of a for loop stepping a local by a constant from a constant to a constant, or
+		None if it isn't such a loop or runs more than max_unroll_size times
+		"""
+		init = node.init
+		if isinstance(init, DeclList) and len(init.decls) == 1:
+			name, start = init.decls[0].name, init.decls[0].init
+		elif isinstance(init, c_ast.Assignment) and init.op == "=" and isinstance(init.lvalue, ID):
+			name, start = init.lvalue.name, init.rvalue
+		else:
+			return None
+		cond = node.cond
+		if start is None or name not in self.curr_function.locals:
+			return None
+		if not (
+			isinstance(cond, c_ast.BinaryOp) and cond.op in ("<", "<=", ">", ">=", "!=") and
+			isinstance(cond.left, ID) and cond.left.name == name
+		):
+			return None
+		step = get_step(node.next, name)
+		if step is None or not all(can_unroll(child, name) for child in walk(node.stmt)):
+			return None
+		try:
+			value = constant_value(start)
+			limit = format_literal(constant_value(cond.right))
+		except TypeError:
+			return None
+		trip_count = 0
+		while fold_condition(JumpCondition(cond.op, format_literal(value), limit)):
+			trip_count += 1
+			value += step
+			if trip_count > self.max_unroll_size:
+				return None
+		return trip_count
+	
+	def push_unrolled_loop(self, node, trip_count):
+		""" push a copy of the body and next for each iteration, False if that'd be too big """
+		func = self.curr_function
+		start = len(func.instructions)
+		#what visiting the body changes besides the instructions, undone if it's too big
+		state = (
+			list(self.probes), set(func.callees), dict(self.special_vars), self.loop_end,
+			self.stats.indirections_avoided
+		)
+		for i in range(trip_count):
+			self.push_probe(node, "body")
+			self.visit(node.stmt)
+			self.visit(node.next)
+			size = len(func.instructions) - start
+			if i == 0 and size * trip_count > self.max_unroll_size:
+				del func.instructions[start:]
+				probes, callees, special_vars, loop_end, indirections_avoided = state
+				for callee in func.callees - callees:
+					self.functions[callee].callers.discard(func.name)
+				self.probes = probes
+				func.callees = callees
+				self.special_vars = special_vars
+				self.loop_end = loop_end
+				self.stats.indirections_avoided = indirections_avoided
+				return False
+		return True
 	
 	def visit_While(self, node):
-		self.start_loop(node.cond)
-		self.visit(node.stmt)
-		self.end_loop()
+		self.push_loop(node, node.cond, node.stmt)
 	
 	def visit_DoWhile(self, node):
-		#jump over the condition on the first iterattion
-		self.push(RelativeJump(None, JumpCondition.always))
-		init_jump_offset = self.curr_offset()
-		self.start_loop(node.cond)
-		self.curr_function.instructions[init_jump_offset].offset = len(
-			self.curr_function.instructions
-		)
+		loop = Loop(self.curr_offset() + 1)
+		self.loops.append(loop)
+		self.push_probe(node, "body")
 		self.visit(node.stmt)
+		self.patch_jumps(loop.continue_jumps)
+		self.push_back_jumps(node.cond, loop.start)
 		self.end_loop()
 	
 	def visit_If(self, node):
-		self.visit(node.cond)
-		self.push_body_jump()
-		cond_jump_offset = self.curr_offset()
-		self.visit(node.iftrue)
-		#jump over else body from end of if body
-		if node.iffalse is not None:
-			self.push(RelativeJump(None, JumpCondition.always))
-			cond_jump_offset2 = self.curr_offset()
-		self.curr_function.instructions[cond_jump_offset].offset = len(
-			self.curr_function.instructions
+		#the body placed last doesn't jump over the other one, so that's where the hot one goes
+		swap = node.iffalse is not None and self.is_hotter(node, "then", "else")
+		bodies = [(node.iftrue, "then"), (node.iffalse, "else")]
+		if swap:
+			bodies.reverse()
+		(first, first_kind), (second, second_kind) = bodies
+		cond_jumps = self.push_cond_jumps(node.cond, swap)
+		if second is not None and self.is_hotter(node, second_kind, first_kind):
+			self.hint_jumps(cond_jumps, True)
+		elif second is not None and self.is_hotter(node, first_kind, second_kind):
+			self.hint_jumps(cond_jumps, False)
+		first_start = self.curr_offset() + 1
+		self.push_probe(node, first_kind)
+		self.visit(first)
+		end_jumps = cond_jumps if second is None else []
+		#jump over else body from end of if body, unless it returned and nothing jumps past that
+		next_offset = self.curr_offset() + 1
+		returned = (
+			next_offset > first_start and isinstance(self.peek(), (Return, End)) and
+			self.loop_end != next_offset and next_offset not in self.curr_function.labels.values()
 		)
-		if node.iffalse is not None:
-			self.visit(node.iffalse)
-			self.curr_function.instructions[cond_jump_offset2].offset = len(
-				self.curr_function.instructions
-			)
+		if second is not None and not returned:
+			self.push(RelativeJump(None, JumpCondition.always))
+			end_jumps.append(self.curr_offset())
+		self.patch_jumps(cond_jumps)
+		if second is not None:
+			self.push_probe(node, second_kind)
+			self.visit(second)
+		self.patch_jumps(end_jumps)
+		if end_jumps:
+			#needs an implicit return after if this is the end of the function
+			self.loop_end = self.curr_offset() + 1
 	
 	def visit_Break(self, node):  #pylint: disable=unused-argument
 		self.push(RelativeJump(None, JumpCondition.always))
 		self.loops[-1].end_jumps.append(self.curr_offset())
 	
 	def visit_Continue(self, node):  #pylint: disable=unused-argument
-		self.push(RelativeJump(self.loops[-1].start, JumpCondition.always))
+		#switches are on the loop stack for break but can't be continued
+		loop = next(loop for loop in reversed(self.loops) if loop.start is not None)
+		self.push(RelativeJump(None, JumpCondition.always))
+		loop.continue_jumps.append(self.curr_offset())
+	
+	def visit_Switch(self, node):
+		items = node.stmt.block_items or []
+		if any(not isinstance(item, (Case, Default)) for item in items):
+			raise NotImplementedError("Statement before first case", node)
+		cases = [item for item in items if isinstance(item, Case)]
+		values = [constant_value(case.expr) for case in cases]
+		if len(set(values)) != len(values):
+			raise ValueError("Duplicate case value", node)
+		self.visit(node.cond)
+		cond = self.get_unary_arg()
+		truncated = None
+		if all(value == int(value) for value in values):
+			#like C converting it to an integer, so both lowerings pick the case a jump table's
+			#computed jump would, or truncates toward zero
+			truncated = self.get_special_var("__switch")
+			self.push(BinaryOp(truncated, cond, "0", "|"))
+			cond = truncated
+		#jumps to each case's body, in the same order as cases
+		case_jumps = [[] for _ in cases]
+		default_jumps = []
+		if self.is_dense(values):
+			self.push_jump_table(cond, values, case_jumps, default_jumps)
+		else:
+			order = sorted(range(len(cases)), key=lambda i: values[i])
+			self.push_compare_tree(cond, [(values[i], i) for i in order], case_jumps, default_jumps)
+		if truncated is not None:
+			self.delete_special_var(truncated)
+		self.loops.append(Loop(None))
+		jumps = iter(case_jumps)
+		for item in items:
+			self.patch_jumps(default_jumps if isinstance(item, Default) else next(jumps))
+			for stmt in item.stmts or []:
+				self.visit(stmt)
+		loop = self.loops.pop()
+		if not any(isinstance(item, Default) for item in items):
+			loop.end_jumps.extend(default_jumps)
+		self.loop_end = self.curr_offset() + 1
+		self.patch_jumps(loop.end_jumps)
+	
+	def is_dense(self, values):
+		""" whether a jump table is worth it for these case values """
+		if len(values) < 4 or any(value != int(value) for value in values):
+			return False
+		if self.optimize_size:
+			low, high = min(values), max(values)
+			#bounds checks, the offset from low if needed, the computed jump and an entry per value
+			return high - low + 4 + (low != 0) <= compare_tree_size(len(values))
+		return max(values) - min(values) + 1 <= 2 * len(values)
+	
+	def push_jump_table(self, cond, values, case_jumps, default_jumps):
+		low, high = int(min(values)), int(max(values))
+		self.push(RelativeJump(None, JumpCondition("<", cond, str(low))))
+		default_jumps.append(self.curr_offset())
+		self.push(RelativeJump(None, JumpCondition(">", cond, str(high))))
+		default_jumps.append(self.curr_offset())
+		index = cond
+		if low != 0:
+			index = self.get_special_var("__switch")
+			self.push(BinaryOp(index, cond, str(low), "-"))
+			self.delete_special_var(index)
+		self.push(ComputedJump(index, high - low + 1))
+		cases = {int(value): i for i, value in enumerate(values)}
+		for value in range(low, high + 1):
+			self.push(RelativeJump(None, JumpCondition.always))
+			if value in cases:
+				case_jumps[cases[value]].append(self.curr_offset())
+			else:
+				default_jumps.append(self.curr_offset())
+	
+	def push_compare_tree(self, cond, cases, case_jumps, default_jumps):
+		""" binary search over cases, a sorted list of (value, case index) """
+		if len(cases) <= 3:
+			for value, i in cases:
+				self.push(RelativeJump(None, JumpCondition("==", cond, format_literal(value))))
+				case_jumps[i].append(self.curr_offset())
+			self.push(RelativeJump(None, JumpCondition.always))
+			default_jumps.append(self.curr_offset())
+			return
+		mid = len(cases) // 2
+		self.push(RelativeJump(None, JumpCondition(">=", cond, format_literal(cases[mid][0]))))
+		upper_jump = self.curr_offset()
+		self.push_compare_tree(cond, cases[:mid], case_jumps, default_jumps)
+		self.patch_jumps([upper_jump])
+		self.push_compare_tree(cond, cases[mid:], case_jumps, default_jumps)
+	
+	def patch_jumps(self, offsets):
+		""" point the jumps at offsets to the next instruction """
+		for offset in offsets:
+			self.curr_function.instructions[offset].offset = len(self.curr_function.instructions)
 	
 	def visit_Return(self, node):
 		if node.expr is None:
 			self.push(Set("__rax", "null"))
+		elif self.is_self_call(node.expr):
+			self.push_self_tail_call(node.expr)
+			return
 		else:
 			self.visit(node.expr)
 		self.push_ret()
@@ -457,7 +1301,8 @@ class Compiler(c_ast.NodeVisitor):
 			arg = args[0]
 			if not isinstance(arg, Constant) or arg.type != "string":
 				raise TypeError("Non-string argument to asm", node)
-			self.push(RawAsm(arg.value[1:-1]))
+			for instruction in mlog.parse(arg.value[1:-1]):
+				self.push(instruction)
 		elif name == "radar":
 			argnames = []
 			for i, arg in enumerate(args):
@@ -494,6 +1339,9 @@ class Compiler(c_ast.NodeVisitor):
 				self.delete_special_var(left)
 		elif name == "end":
 			self.push(End())
+		elif name == "__builtin_expect":
+			#only a hint for conditions, see push_cond_jumps
+			self.visit(args[0])
 		elif name in draw_funcs:
 			argnames = self.get_multiple_builtin_args(args, name)
 			cmd = draw_funcs[name]
@@ -503,31 +1351,118 @@ class Compiler(c_ast.NodeVisitor):
 					self.delete_special_var(argname)
 		elif name in func_binary_ops:
 			left, right = self.get_binary_builtin_args(args, name)
-			self.push(BinaryOp("__rax", left, right, name))
+			self.push_binary_op(left, right, name)
 			if left.startswith(f"__{name}_arg"):
 				self.delete_special_var(left)
 		elif name in func_unary_ops:
-			self.push(UnaryOp("__rax", self.get_unary_builtin_arg(args), name))
+			self.push_unary_op(self.get_unary_builtin_arg(args), name)
+		elif name in self.remotes:
+			self.push_remote_call(name, args)
 		else:
 			try:
 				func = self.functions[name]
 			except KeyError:
 				raise ValueError(f"{name} is not a function")
-			if self.opt_level >= 2:
-				self.curr_function.callees.add(name)
-				func.callers.add(self.curr_function.name)
+			self.curr_function.callees.add(name)
+			func.callers.add(self.curr_function.name)
 			for param, arg in zip(func.params, args):
 				self.visit(arg)
 				self.set_to_rax(f"_{param}_{name}")
 			self.push(Set("__retaddr_" + name, self.curr_offset() + 3))
 			self.push(FunctionCall(name))
 	
+	def visit_Pragma(self, node):
+		if node.string.split()[:1] != ["processor"] or self.curr_function is not None:
+			raise NotImplementedError(node)
+	
 	def generic_visit(self, node):
 		if isinstance(node, (FileAST, Compound, DeclList)):
 			super().generic_visit(node)
 		else:
 			raise NotImplementedError(node)
 
+def is_expect(node):
+	""" whether node is __builtin_expect(expr, expected), which hints that expr is usually expected """
+	return isinstance(node,
+		FuncCall) and isinstance(node.name, ID) and node.name.name == "__builtin_expect"
+
+def constant_value(node):
+	""" value of a constant expression, such as a case label """
+	if isinstance(node, Constant):
+		value = literal_value(node.value)
+	elif isinstance(node, c_ast.UnaryOp):
+		value = literal_value(fold_unary_op(node.op, format_literal(constant_value(node.expr))))
+	elif isinstance(node, c_ast.BinaryOp):
+		left = format_literal(constant_value(node.left))
+		right = format_literal(constant_value(node.right))
+		value = literal_value(fold_binary_op(node.op, left, right))
+	else:
+		value = None
+	if value is None:
+		raise TypeError("Non-constant expression", node)
+	return value
+
+def get_program(functions, entry):
+	""" copies of entry and the functions it calls, which make up the program of one processor """
+	reached = {entry}
+	worklist = [entry]
+	while worklist:
+		for callee in functions[worklist.pop()].callees:
+			if callee not in reached and callee in functions:
+				reached.add(callee)
+				worklist.append(callee)
+	#the entry comes first, as dispatchers start without being called
+	names = [entry] + [name for name in functions if name in reached and name != entry]
+	return {name: copy.deepcopy(functions[name]) for name in names}
+
+def compare_tree_size(num_cases):
+	""" instructions emitted by push_compare_tree """
+	if num_cases <= 3:
+		return num_cases + 1
+	mid = num_cases // 2
+	return 1 + compare_tree_size(mid) + compare_tree_size(num_cases - mid)
+
+def parse_opt_level(level):
+	return level if level == "s" else int(level)
+
+#optimization levels accepted by -O
+opt_levels = [0, 1, 2, 3, 4, "s"]
+
+def get_step(node, name):
+	""" the constant that node adds to the variable name, or None """
+	if isinstance(node, c_ast.UnaryOp) and node.op in ("++", "--", "p++", "p--"):
+		if isinstance(node.expr, ID) and node.expr.name == name:
+			return 1 if "+" in node.op else -1
+	elif isinstance(node, c_ast.Assignment) and node.op in ("+=", "-="):
+		if isinstance(node.lvalue, ID) and node.lvalue.name == name:
+			try:
+				step = constant_value(node.rvalue)
+			except TypeError:
+				return None
+			return step if node.op == "+=" else -step
+	return None
+
+def can_unroll(node, counter):
+	""" whether node can be copied into each iteration of an unrolled loop counting with counter """
+	#declarations and labels can't be repeated, and jumps out of the body have nowhere to go
+	if isinstance(
+		node, (c_ast.Break, c_ast.Continue, c_ast.Goto, c_ast.Label, c_ast.Switch, c_ast.Decl)
+	):
+		return False
+	if isinstance(node, c_ast.Assignment):
+		return not (isinstance(node.lvalue, ID) and node.lvalue.name == counter)
+	if isinstance(node, c_ast.UnaryOp) and node.op in ("++", "--", "p++", "p--"):
+		return not (isinstance(node.expr, ID) and node.expr.name == counter)
+	return True
+
+def referenced_names(node):
+	return {child.name for child in walk(node) if isinstance(child, ID)}
+
+def walk(node):
+	yield node
+	for _, child in node.children():
+		yield from walk(child)
+
 def get_include_path():
 	if os.name == "posix":
 		return sysconfig.get_path("include", "posix_user")
@@ -536,14 +1471,198 @@ def get_include_path():
 	else:
 		raise ValueError(f"Unknown os {os.name}")
 
-def main():
+def main(argv=None):
+	""" the c2logic command, argv defaults to sys.argv[1:] """
 	import argparse
-	parser = argparse.ArgumentParser()
-	parser.add_argument("file")
-	parser.add_argument("-O", "--optimization-level", type=int, choices=range(4), default=1)
+	parser = argparse.ArgumentParser(prog="c2logic")
+	parser.add_argument(
+		"files",
+		nargs="+",
+		metavar="file",
+		help="C source, several files or glob patterns are each compiled to a .mlog file"
+	)
+	parser.add_argument(
+		"-O",
+		"--optimization-level",
+		type=parse_opt_level,
+		choices=opt_levels,
+		default=1,
+		help="0 to 4, or s to make the program as small as possible"
+	)
 	parser.add_argument("-o", "--output", type=argparse.FileType('w'), default="-")
-	args = parser.parse_args()
-	print(Compiler(args.optimization_level).compile(args.file), file=args.output)
+	parser.add_argument(
+		"--inline-threshold",
+		type=int,
+		default=10,
+		help="max instructions of a function inlined at every call site on -O2 and above"
+	)
+	parser.add_argument(
+		"--no-cache", action="store_true", help="always run cpp instead of reusing parsed files"
+	)
+	parser.add_argument(
+		"--preprocessor",
+		choices=preprocessors.keys(),
+		default="cpp",
+		help="builtin doesn't need cpp installed but only supports a subset of it"
+	)
+	parser.add_argument(
+		"--stats",
+		"--timings",
+		action="store_true",
+		help="print the time taken by each phase and the size of each function after each pass"
+	)
+	parser.add_argument(
+		"--array-threshold",
+		type=int,
+		default=8,
+		help="max elements of an array stored in variables, larger arrays are stored in memory"
+	)
+	parser.add_argument(
+		"--array-memory", default="cell1", help="memory cell or bank larger arrays are stored in"
+	)
+	parser.add_argument(
+		"--array-memory-size",
+		type=int,
+		default=64,
+		help="number of values --array-memory holds, 64 for a cell and 512 for a bank"
+	)
+	parser.add_argument(
+		"--sensor-policy",
+		choices=sensor_policies,
+		default="block",
+		help="block reuses sensor and radar results within a block on -O4, never always reads them "
+		"again"
+	)
+	parser.add_argument(
+		"--instrument",
+		metavar="MEMORY",
+		help="count how often each branch, loop and function runs in this memory cell or bank, "
+		"printing which address counts what to stderr"
+	)
+	parser.add_argument(
+		"--profile",
+		help="JSON profile of an instrumented build, such as from c2logic-emulate --save-profile"
+	)
+	parser.add_argument(
+		"--shared-memory",
+		default="cell3",
+		help="memory cell or bank linked to every processor of a program split with "
+		"#pragma processor"
+	)
+	parser.add_argument(
+		"--shared-memory-size",
+		type=int,
+		default=64,
+		help="number of values --shared-memory holds, 64 for a cell and 512 for a bank"
+	)
+	parser.add_argument(
+		"--max-instructions",
+		type=int,
+		default=1000,
+		help="instructions a processor holds, programs aren't inlined past it and are warned about "
+		"when over it"
+	)
+	parser.add_argument(
+		"--output-dir", help="where to write .mlog files instead of next to each source"
+	)
+	parser.add_argument(
+		"-j", "--jobs", type=int, help="processes to compile with, defaults to the number of CPUs"
+	)
+	parser.add_argument(
+		"--watch",
+		action="store_true",
+		help="recompile files whenever they or their headers change"
+	)
+	parser.add_argument(
+		"--emit-map",
+		metavar="PATH",
+		help="write the function and C source line each mlog line was compiled from to PATH"
+	)
+	parser.add_argument(
+		"--cost-report",
+		action="store_true",
+		help="print the instructions of each function, loop body and call site, and the most each "
+		"runs per call or iteration"
+	)
+	args = parser.parse_args(argv)
+	try:
+		run(args)
+	finally:
+		#a compile server keeps running after main returns
+		if args.output is not sys.stdout:
+			args.output.close()
+
+def run(args):
+	""" compile what the parsed command line args of main ask for """
+	import glob
+	options = {
+		"opt_level": args.optimization_level,
+		"inline_threshold": args.inline_threshold,
+		"preprocessor": args.preprocessor,
+		"array_threshold": args.array_threshold,
+		"array_memory": args.array_memory,
+		"array_memory_size": args.array_memory_size,
+		"instrument": args.instrument,
+		"shared_memory": args.shared_memory,
+		"shared_memory_size": args.shared_memory_size,
+		"max_instructions": args.max_instructions,
+		"sensor_policy": args.sensor_policy,
+		"profile": None if args.profile is None else Profile.load(args.profile)
+	}
+	is_batch = len(args.files) > 1 or glob.has_magic(args.files[0])
+	if not is_batch and args.output_dir is None and not args.watch:
+		compiler = Compiler(cache=None if args.no_cache else Cache(), **options)
+		print(compiler.compile(args.files[0]), file=args.output)
+		from .batch import processor_path
+		for processor, program in compiler.programs.items():
+			if processor == "main":
+				continue
+			if args.output is sys.stdout:
+				print(f"# processor {processor}\n{program}", file=args.output)
+			else:
+				with open(processor_path(args.output.name, processor), "w") as f:
+					print(program, file=f)
+		for warning in compiler.stats.warnings:
+			print(f"warning: {warning}", file=sys.stderr)
+		if args.stats:
+			print(compiler.stats.report(compiler.max_instructions), file=sys.stderr)
+		elif compiler.optimize_size or compiler.stats.instructions > compiler.max_instructions:
+			print(
+				f"{compiler.stats.instructions} of {compiler.max_instructions} instructions",
+				file=sys.stderr
+			)
+		if args.instrument is not None:
+			for i, key in enumerate(compiler.probes):
+				print(f"{args.instrument} {i}: {key}", file=sys.stderr)
+		if args.emit_map is not None:
+			for processor, entries in compiler.source_maps.items():
+				path = args.emit_map
+				if processor != "main":
+					path = processor_path(args.emit_map, processor)
+				with open(path, "w") as f:
+					print(format_source_map(entries), file=f)
+		if args.cost_report:
+			from .cost import cost_report
+			print(cost_report(compiler.functions), file=sys.stderr)
+		return
+	if args.emit_map is not None or args.cost_report:
+		raise SystemExit("--emit-map and --cost-report only work when compiling a single file")
+	from concurrent.futures import ProcessPoolExecutor
+	from . import batch
+	options["use_cache"] = not args.no_cache
+	with ProcessPoolExecutor(args.jobs) as executor:
+		if args.watch:
+			try:
+				batch.watch(args.files, args.output_dir, executor, show_stats=args.stats, **options)
+			except KeyboardInterrupt:
+				pass
+			return
+		results = batch.compile_files(
+			batch.expand(args.files), args.output_dir, executor, **options
+		)
+	print(batch.summary(results, args.stats, args.max_instructions), file=args.output)
+	if any(result.error is not None for result in results):
+		raise SystemExit(1)
 
 if __name__ == "__main__":
 	main()
@@ -44,5 +44,9 @@ draw_funcs = {
 
 builtins = [
 	"print", "printd", "printflush", "radar", "sensor", "enable", "shoot", "get_link", "read",
-	"write", "drawflush", "end"
+	"write", "drawflush", "end", "__builtin_expect"
 ] + list(draw_funcs.keys())
+
+#draw commands a processor buffers before drawflush, later ones are dropped
+#see https://github.com/Anuken/Mindustry/blob/master/core/src/mindustry/logic/LExecutor.java
+max_graphics_buffer = 256
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+
+from .instructions import FunctionCall
+from .layout import control_flow_graph, depth_first_order
+
+@dataclass
+class Cost():
+	"""
+	the static cost of a function, loop body or call site
+	worst_case is the most instructions one run of it executes, one iteration for a loop, and
+	repeats is whether that counts loops it contains, or calls, as running once
+	"""
+	kind: str
+	name: str
+	coord: object
+	instructions: int
+	worst_case: int
+	repeats: bool
+
+def natural_loops(blocks, back_edges):
+	""" {header start: starts of the blocks of its body} for each loop, by header """
+	loops = {}
+	for tail, header in back_edges:
+		body = loops.setdefault(header, {header})
+		stack = [tail]
+		while stack:
+			start = stack.pop()
+			if start not in body:
+				body.add(start)
+				stack.extend(blocks[start].preds)
+	return dict(sorted(loops.items()))
+
+def loop_coord(function, blocks, header, back_edges):
+	""" where a loop is in the source, that of the jumps looping back, as they test its condition """
+	coords = [
+		function.instructions[blocks[tail].end - 1].coord
+		for tail, target in back_edges if target == header
+	]
+	coords = [coord for coord in coords if coord is not None]
+	return min(coords, key=lambda coord: (coord.line, coord.column or 0), default=None)
+
+class CostModel():
+	""" the static costs of the functions of a program """
+	def __init__(self, functions):
+		self.functions = functions
+		#function name -> (worst case instructions per call, whether it repeats)
+		self.worst_cases = {}
+	
+	def worst_case(self, func_name):
+		if func_name not in self.worst_cases:
+			#recursive calls are counted once
+			self.worst_cases[func_name] = (0, True)
+			function = self.functions.get(func_name)
+			if function is None or not function.instructions:
+				self.worst_cases[func_name] = (0, False)
+			else:
+				blocks = control_flow_graph(function)
+				_, back_edges = depth_first_order(blocks)
+				count, repeats = self.longest_path(function, blocks, back_edges, set(blocks))
+				self.worst_cases[func_name] = (count, repeats or bool(back_edges))
+		return self.worst_cases[func_name]
+	
+	def block_cost(self, function, block):
+		""" instructions block executes, including the callees it calls, and whether it repeats """
+		count = block.end - block.start
+		repeats = False
+		for instruction in function.instructions[block.start:block.end]:
+			if isinstance(instruction, FunctionCall):
+				callee_count, callee_repeats = self.worst_case(instruction.func_name)
+				count += callee_count
+				repeats |= callee_repeats
+		return count, repeats
+	
+	def longest_path(self, function, blocks, back_edges, within, start=0):
+		"""
+		the most instructions executed from start to a block leaving within or looping back, and
+		whether a block on that path repeats
+		"""
+		paths = {}
+		order, _ = depth_first_order(blocks)
+		for block_start in reversed(order):
+			if block_start not in within:
+				continue
+			count, repeats = self.block_cost(function, blocks[block_start])
+			following = [
+				paths[succ] for succ in blocks[block_start].succs
+				if succ in paths and (block_start, succ) not in back_edges
+			]
+			longest = max(following, default=(0, False))
+			paths[block_start] = (count + longest[0], repeats or longest[1])
+		return paths.get(start, (0, False))
+	
+	def costs(self, func_name):
+		""" the Costs of func_name, and of its loops and call sites """
+		function = self.functions[func_name]
+		count, repeats = self.worst_case(func_name)
+		costs = [
+			Cost("function", func_name, function.coord, len(function.instructions), count, repeats)
+		]
+		if not function.instructions:
+			return costs
+		blocks = control_flow_graph(function)
+		_, back_edges = depth_first_order(blocks)
+		for header, body in natural_loops(blocks, back_edges).items():
+			coord = loop_coord(function, blocks, header, back_edges)
+			size = sum(blocks[start].end - blocks[start].start for start in body)
+			count, repeats = self.longest_path(function, blocks, back_edges, body, header)
+			#inner loops are counted as running once
+			repeats |= any(other != header and other in body for _, other in back_edges)
+			costs.append(Cost("loop", func_name, coord, size, count, repeats))
+		for instruction in function.instructions:
+			if isinstance(instruction, FunctionCall):
+				#the arguments, return address, jump and result move are compiled from the call
+				site = [
+					other for other in function.instructions
+					if instruction.coord is not None and str(other.coord) == str(instruction.coord)
+				]
+				size = max(len(site), 1)
+				count, repeats = self.worst_case(instruction.func_name)
+				call = Cost(
+					"call", instruction.func_name, instruction.coord, size, size + count, repeats
+				)
+				costs.append(call)
+		return costs
+
+def cost_report(functions):
+	"""
+	a table of the instructions of each function, loop body and call site, and the most each
+	executes per call, iteration or call, with + where loops inside are counted as running once
+	"""
+	model = CostModel(functions)
+	lines = [f"{'':<28} {'instructions':>12} {'worst case':>11}  source"]
+	for func_name in functions:
+		for cost in model.costs(func_name):
+			if cost.kind == "function":
+				label = f"function {cost.name}"
+			else:
+				#loops and calls are indented under their function
+				label = f"  call {cost.name}" if cost.kind == "call" else "  loop"
+			source = "-" if cost.coord is None else str(cost.coord)
+			worst_case = f"{cost.worst_case}{'+' if cost.repeats else ''}"
+			lines.append(f"{label:<28} {cost.instructions:>12} {worst_case:>11}  {source}")
+	return "\n".join(lines)
@@ -0,0 +1,107 @@
+from .flow import defs, jump_targets, uses
+from .instructions import (
+	BinaryOp, DrawFlush, Enable, GetLink, PrintFlush, Radar, Sensor, Set, Shoot, UnaryOp, Write
+)
+from .propagate import impure_ops, literal_value
+
+commutative_ops = {"+", "*", "==", "!=", "&", "|", "^", "max", "min"}
+#how long sensor and radar results are reused, as the world can change between any two instructions
+#block reuses them within an extended basic block, so a value sensed twice in a row is read once
+sensor_policies = ["block", "never"]
+
+def expression(instruction, value):
+	"""
+	the value computed by instruction as a hashable key, None if it can't be reused
+	value(operand) is the variable or literal that operand is a copy of
+	"""
+	if isinstance(instruction, BinaryOp) and instruction.op not in impure_ops:
+		operands = (value(instruction.left), value(instruction.right))
+		if instruction.op in commutative_ops:
+			operands = tuple(sorted(operands))
+		return ("op", instruction.op, *operands)
+	elif isinstance(instruction, UnaryOp) and instruction.op not in impure_ops:
+		return ("op", instruction.op, value(instruction.src))
+	elif isinstance(instruction, GetLink):
+		return ("getlink", value(instruction.index))
+	elif isinstance(instruction, Sensor):
+		return ("sensor", value(instruction.src), instruction.prop)
+	elif isinstance(instruction, Radar):
+		return (
+			"radar", value(instruction.src), instruction.target1, instruction.target2,
+			instruction.target3, instruction.sort, value(instruction.index)
+		)
+	return None
+
+def reads_builtin_variable(instruction):
+	""" whether instruction reads a variable such as @time or @unit, which changes by itself """
+	return any(var.startswith("@") for var in uses(instruction))
+
+def is_sensed(instruction):
+	""" whether instruction reads the world, which can change between any two instructions """
+	return isinstance(instruction, (Sensor, Radar))
+
+def acts_on_world(instruction):
+	""" whether instruction changes buildings or units, so what was sensed may have changed """
+	return isinstance(instruction, (Enable, Shoot, Write, PrintFlush, DrawFlush))
+
+def eliminate_common_subexpressions(function, sensor_policy="block"):
+	"""
+	replace instructions computing a value already held by a variable with a copy of it
+	values are numbered along extended basic blocks, until a write to their operands or the variable
+	holding them, a jump target or an instruction that may write anything, such as a call
+	sensor, radar and getlink results are also forgotten when an instruction acts on the world
+	returns whether anything was replaced
+	"""
+	instructions = function.instructions
+	targets = jump_targets(function)
+	available = {}
+	#variables holding a copy of another variable
+	copies = {}
+	value = lambda operand: copies.get(operand, operand)
+	changed = False
+	for i, instruction in enumerate(instructions):
+		if i in targets:
+			available = {}
+			copies = {}
+		written = defs(instruction)
+		if written is None or uses(instruction) is None:
+			available = {}
+			copies = {}
+			continue
+		if acts_on_world(instruction):
+			available = {
+				expr: holder
+				for expr, holder in available.items()
+				if expr[0] not in ("sensor", "radar", "getlink")
+			}
+		key = expression(instruction, value)
+		#values of builtin variables are never reused, sensor_policy decides for sensors and radars
+		if key is not None and reads_builtin_variable(instruction):
+			key = None
+		if key is not None and is_sensed(instruction) and sensor_policy == "never":
+			key = None
+		if key is not None and key in available and not instruction.dest.startswith("@"):
+			instructions[i] = instruction = Set(instruction.dest,
+				available[key]).replaces(instruction)
+			changed = True
+			if instruction.src == instruction.dest:  # already holds the value
+				continue
+		for var in written:
+			available = {
+				expr: holder
+				for expr, holder in available.items() if holder != var and var not in expr[1:]
+			}
+			copies = {copy: src for copy, src in copies.items() if var not in (copy, src)}
+		if any(var.startswith("@") for var in written):
+			continue
+		if key is not None and not written & set(key[1:]):
+			available.setdefault(key, instruction.dest)
+		if isinstance(instruction, Set) and is_variable(instruction.src):
+			src = value(instruction.src)
+			if src != instruction.dest:
+				copies[instruction.dest] = src
+	return changed
+
+def is_variable(operand):
+	return isinstance(operand,
+		str) and literal_value(operand) is None and not operand.startswith(('"', "@"))
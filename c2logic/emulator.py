@@ -0,0 +1,314 @@
+import math
+import random
+import re
+import sys
+from dataclasses import dataclass, field
+
+from .consts import max_graphics_buffer
+from .mlog import token_re
+from .ops import (
+	eval_binary_op, eval_condition, eval_unary_op, num, parse_number, to_long, unary_op_funcs
+)
+
+#see https://github.com/Anuken/Mindustry/blob/master/core/src/mindustry/logic/LExecutor.java
+max_text_buffer = 400
+
+@dataclass
+class Building():
+	name: str
+	memory: dict = field(default_factory=dict)
+	sensors: dict = field(default_factory=dict)
+	messages: list = field(default_factory=list)
+	draw_commands: list = field(default_factory=list)
+	enabled: float = 1
+	
+	def __str__(self):
+		return self.name
+
+@dataclass
+class RunStats():
+	instructions: int = 0
+	jumps: int = 0
+	ended: bool = False
+	
+	def ticks(self, ipt: int):
+		return math.ceil(self.instructions / ipt)
+
+def format_value(val):
+	if val is None:
+		return "null"
+	if isinstance(val, (int, float)):
+		if math.isfinite(val) and abs(val - int(val)) < 0.00001:
+			return str(int(val))
+		return str(val)
+	return str(val)
+
+building_re = re.compile(r"[a-z]+[0-9]+")
+
+class Emulator():
+	"""
+	runs compiled mlog and counts executed instructions
+	override read/write/sensor/radar/control to stub out the world
+	"""
+	def __init__(self, code, links=None, seed=0):
+		if not isinstance(code, str):  # list of Instructions
+			code = "\n".join(map(str, code))
+		self.variables = {}
+		self.buildings = {}
+		self.text_buffer = []
+		self.graphics_buffer = []
+		self.counter = 0
+		self.time = 0
+		self.random = random.Random(seed)
+		self.links = [self.get_building(name) for name in links or []]
+		self.instructions = self.parse(code)
+	
+	def parse(self, code: str):
+		lines = []
+		labels = {}
+		for line in code.splitlines():
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			tokens = token_re.findall(line)
+			if len(tokens) == 1 and tokens[0].endswith(":"):
+				labels[tokens[0][:-1]] = len(lines)
+				continue
+			lines.append(tokens)
+		instructions = []
+		for tokens in lines:
+			opcode, *args = tokens
+			if opcode == "jump" and args[0] in labels:
+				args[0] = str(labels[args[0]])
+			try:
+				handler = getattr(self, "exec_" + opcode)
+			except AttributeError:
+				raise ValueError(f"Unknown instruction {' '.join(tokens)}") from None
+			instructions.append((handler, args))
+		return instructions
+	
+	def get_building(self, name: str):
+		if name not in self.buildings:
+			self.buildings[name] = Building(name)
+		return self.buildings[name]
+	
+	def get(self, token: str):
+		if token.startswith('"'):
+			return token[1:-1].replace("\\n", "\n")
+		if token.startswith("@"):
+			return self.get_special(token[1:])
+		if token in self.variables:
+			return self.variables[token]
+		val = parse_number(token)
+		if val is not None:
+			return val
+		if token == "null":
+			return None
+		if token == "true":
+			return 1.0
+		if token == "false":
+			return 0.0
+		if building_re.fullmatch(token):  # linked building
+			return self.get_building(token)
+		return None
+	
+	def get_special(self, name: str):
+		if name == "counter":
+			return float(self.counter)
+		elif name == "links":
+			return float(len(self.links))
+		elif name == "time":
+			return float(self.time)
+		elif name == "ipt":
+			return 1.0
+		return name  # content/sensor names
+	
+	def set(self, token: str, val):
+		if token == "@counter":
+			self.counter = to_long(val)
+			self.stats.jumps += 1
+		elif not token.startswith("@"):
+			self.variables[token] = val
+	
+	#hooks
+	def read(self, cell, index):
+		if isinstance(cell, Building):
+			return cell.memory.get(to_long(index), 0.0)
+		return None
+	
+	def write(self, val, cell, index):
+		if isinstance(cell, Building):
+			cell.memory[to_long(index)] = num(val)
+	
+	def sensor(self, obj, prop):
+		if isinstance(obj, Building):
+			if prop == "enabled":
+				return obj.enabled
+			return obj.sensors.get(prop, 0.0)
+		return None
+	
+	def radar(self, obj, target1, target2, target3, sort, order):  #pylint: disable=unused-argument
+		return None
+	
+	def control(self, cmd, obj, *args):
+		if cmd == "enabled" and isinstance(obj, Building):
+			obj.enabled = num(args[0])
+	
+	#instructions
+	def exec_noop(self):
+		pass
+	
+	def exec_end(self):
+		self.counter = len(self.instructions)
+		self.stats.ended = True
+	
+	def exec_wait(self, _duration):
+		pass
+	
+	def exec_set(self, dest, src):
+		self.set(dest, self.get(src))
+	
+	def exec_op(self, op, dest, left, right):
+		if op in unary_op_funcs:
+			if op == "rand":
+				val = self.random.random() * num(self.get(left))
+			else:
+				val = eval_unary_op(op, self.get(left))
+		else:
+			val = eval_binary_op(op, self.get(left), self.get(right))
+		self.set(dest, val)
+	
+	def exec_jump(self, target, op, left="0", right="0"):
+		if eval_condition(op, self.get(left), self.get(right)):
+			self.counter = int(target)
+			self.stats.jumps += 1
+	
+	def exec_print(self, val):
+		if len(self.text_buffer) < max_text_buffer:
+			self.text_buffer.append(format_value(self.get(val)))
+	
+	def exec_printflush(self, message):
+		message = self.get(message)
+		if isinstance(message, Building):
+			message.messages.append("".join(self.text_buffer))
+		self.text_buffer = []
+	
+	def exec_draw(self, cmd, *args):
+		if len(self.graphics_buffer) < max_graphics_buffer:
+			self.graphics_buffer.append((cmd, ) + tuple(num(self.get(arg)) for arg in args))
+	
+	def exec_drawflush(self, display):
+		display = self.get(display)
+		if isinstance(display, Building):
+			display.draw_commands.extend(self.graphics_buffer)
+		self.graphics_buffer = []
+	
+	def exec_getlink(self, dest, index):
+		index = to_long(self.get(index))
+		self.set(dest, self.links[index] if 0 <= index < len(self.links) else None)
+	
+	def exec_read(self, dest, cell, index):
+		self.set(dest, self.read(self.get(cell), self.get(index)))
+	
+	def exec_write(self, val, cell, index):
+		self.write(self.get(val), self.get(cell), self.get(index))
+	
+	def exec_sensor(self, dest, obj, prop):
+		self.set(dest, self.sensor(self.get(obj), self.get(prop)))
+	
+	def exec_radar(self, target1, target2, target3, sort, obj, order, dest):
+		self.set(dest, self.radar(self.get(obj), target1, target2, target3, sort, self.get(order)))
+	
+	def exec_control(self, cmd, obj, *args):
+		self.control(cmd, self.get(obj), *map(self.get, args))
+	
+	def run(self, max_instructions: int = 1000000):
+		""" execute from the top of the program until end or the counter wraps """
+		self.stats = RunStats()
+		self.counter = 0
+		instructions = self.instructions
+		while 0 <= self.counter < len(instructions):
+			if self.stats.instructions >= max_instructions:
+				raise RuntimeError(f"Exceeded {max_instructions} instructions")
+			handler, args = instructions[self.counter]
+			self.counter += 1
+			self.stats.instructions += 1
+			self.time += 1
+			handler(*args)
+		return self.stats
+	
+	def messages(self):
+		return {
+			name: building.messages
+			for name, building in self.buildings.items() if building.messages
+		}
+
+def main():
+	import argparse
+	from .compiler import Compiler, opt_levels, parse_opt_level
+	parser = argparse.ArgumentParser(description="Run compiled programs and count instructions.")
+	parser.add_argument("files", nargs="+", help="C sources, or mlog if not ending in .c")
+	parser.add_argument(
+		"-O",
+		"--optimization-level",
+		type=parse_opt_level,
+		nargs="+",
+		choices=opt_levels,
+		default=[1]
+	)
+	parser.add_argument("--ipt", type=int, default=8, help="instructions per tick of the processor")
+	parser.add_argument("--runs", type=int, default=1)
+	parser.add_argument("--max-instructions", type=int, default=1000000)
+	parser.add_argument("-v", "--verbose", action="store_true", help="print flushed messages")
+	parser.add_argument(
+		"--save-profile",
+		metavar="PATH",
+		help="run instrumented builds of the C sources at the first -O level instead, and save how "
+		"often each part ran for c2logic --profile"
+	)
+	parser.add_argument(
+		"--profile-memory", default="cell2", help="memory the instrumented builds count in"
+	)
+	args = parser.parse_args()
+	if args.save_profile is not None:
+		from .profile import Profile, collect
+		profile = Profile()
+		for filename in args.files:
+			counts = collect(
+				filename,
+				args.runs,
+				args.max_instructions,
+				args.profile_memory,
+				opt_level=args.optimization_level[0]
+			).counts
+			for key, count in counts.items():
+				profile.counts[key] = profile.counts.get(key, 0) + count
+		profile.save(args.save_profile)
+		return
+	print(f"{'file':<30} {'O':>2} {'instructions':>12} {'jumps':>8} {'ticks':>8}")
+	for filename in args.files:
+		if filename.endswith(".c"):
+			programs = [
+				(level, Compiler(level).compile(filename)) for level in args.optimization_level
+			]
+		else:
+			with open(filename) as f:
+				programs = [("-", f.read())]
+		for level, code in programs:
+			emulator = Emulator(code)
+			stats = RunStats()
+			for _ in range(args.runs):
+				run_stats = emulator.run(args.max_instructions)
+				stats.instructions += run_stats.instructions
+				stats.jumps += run_stats.jumps
+			print(
+				f"{filename:<30} {level:>2} {stats.instructions:>12} {stats.jumps:>8} "
+				f"{stats.ticks(args.ipt):>8}"
+			)
+			if args.verbose:
+				for name, messages in emulator.messages().items():
+					for message in messages:
+						print(f"{name}: {message!r}", file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
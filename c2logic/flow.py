@@ -0,0 +1,184 @@
+from .instructions import (
+	BinaryOp, ComputedJump, Draw, End, FunctionCall, GetLink, Goto, JumpCondition, Radar, Read,
+	RelativeJump, Return, Sensor, Set, UnaryOp
+)
+
+dest_types = (Set, BinaryOp, UnaryOp, Radar, Sensor, GetLink, Read)
+
+def is_retaddr(instruction):
+	return isinstance(instruction, Set) and instruction.dest.startswith("__retaddr")
+
+def defs(instruction):
+	""" variables written by instruction, None if unknown """
+	return instruction.defs()
+
+def uses(instruction):
+	""" variables read by instruction, None if unknown """
+	return instruction.uses()
+
+def is_unconditional_jump(instruction):
+	return isinstance(
+		instruction, Goto
+	) or (isinstance(instruction, RelativeJump) and instruction.cond == JumpCondition.always)
+
+def is_conditional_jump(instruction):
+	return isinstance(instruction, RelativeJump) and instruction.cond != JumpCondition.always
+
+def falls_through(instruction):
+	return not (
+		is_unconditional_jump(instruction) or
+		isinstance(instruction, (Return, End, FunctionCall, ComputedJump))
+	)
+
+def jump_target(function, instruction):
+	if isinstance(instruction, RelativeJump):
+		return instruction.offset
+	elif isinstance(instruction, Goto):
+		return function.labels[instruction.label]
+	elif is_retaddr(instruction):
+		return instruction.src
+	return None
+
+def jump_targets(function):
+	""" offsets that can be reached other than by falling through """
+	targets = set()
+	for i, instruction in enumerate(function.instructions):
+		target = jump_target(function, instruction)
+		if target is not None:
+			targets.add(target)
+		elif isinstance(instruction, ComputedJump):
+			targets.update(range(i + 1, i + 1 + instruction.size))
+	return targets
+
+def table_entries(function):
+	""" offsets of the jump tables following computed jumps, which must stay in place """
+	entries = set()
+	for i, instruction in enumerate(function.instructions):
+		if isinstance(instruction, ComputedJump):
+			entries.update(range(i + 1, i + 1 + instruction.size))
+	return entries
+
+def successors(function, offset):
+	instruction = function.instructions[offset]
+	succs = []
+	if falls_through(instruction):
+		succs.append(offset + 1)
+	elif isinstance(instruction, ComputedJump):
+		succs.extend(range(offset + 1, offset + 1 + instruction.size))
+	target = jump_target(function, instruction)
+	if target is not None:
+		succs.append(target)
+	return [succ for succ in succs if succ < len(function.instructions)]
+
+def reachable(function):
+	seen = set()
+	stack = [0] if function.instructions else []
+	while stack:
+		offset = stack.pop()
+		if offset in seen:
+			continue
+		seen.add(offset)
+		stack.extend(successors(function, offset))
+	return seen
+
+def retarget(function, mapping):
+	""" rewrite every jump target in function with mapping(old_offset) """
+	for instruction in function.instructions:
+		if isinstance(instruction, RelativeJump):
+			instruction.offset = mapping(instruction.offset)
+		elif is_retaddr(instruction):
+			instruction.src = mapping(instruction.src)
+	function.labels = {label: mapping(offset) for label, offset in function.labels.items()}
+
+def remove_instructions(function, offsets):
+	"""
+	delete the instructions at offsets, jumps to them go to the next remaining instruction
+	entries of jump tables that are kept are never removed, returns whether anything was removed
+	"""
+	for i, instruction in enumerate(function.instructions):
+		if isinstance(instruction, ComputedJump) and i not in offsets:
+			offsets = offsets - set(range(i + 1, i + 1 + instruction.size))
+	if not offsets:
+		return False
+	new_offsets = []
+	count = 0
+	for offset in range(len(function.instructions) + 1):
+		new_offsets.append(count)
+		if offset not in offsets:
+			count += 1
+	function.instructions = [
+		instruction
+		for offset, instruction in enumerate(function.instructions) if offset not in offsets
+	]
+	retarget(function, new_offsets.__getitem__)
+	return True
+
+def rename(instruction, mapping, dests=True):
+	""" rename the variables read (and written if dests) by instruction """
+	get = lambda var: mapping.get(var, var)
+	if isinstance(instruction, RelativeJump):
+		cond = instruction.cond
+		if cond.left in mapping or cond.right in mapping:
+			instruction.cond = JumpCondition(cond.op, get(cond.left), get(cond.right))
+	elif isinstance(instruction, Draw):
+		instruction.args = tuple(map(get, instruction.args))
+	elif not is_retaddr(instruction):
+		fields = instruction.srcs + instruction.dests if dests else instruction.srcs
+		for field in fields:
+			setattr(instruction, field, get(getattr(instruction, field)))
+
+def local_names(function):
+	return {f"_{name}_{function.name}" for name in function.locals}
+
+def param_names(function):
+	return {f"_{name}_{function.name}" for name in function.params}
+
+def is_temp(var):
+	""" variables allocated by Compiler.get_special_var """
+	if not var.startswith("__") or var.startswith("__retaddr"):
+		return False
+	return var.rpartition("_")[2].isdigit()
+
+def liveness(function, tracked):
+	""" per instruction sets of tracked variables live before and after it """
+	instructions = function.instructions
+	succs = [successors(function, i) for i in range(len(instructions))]
+	gen = []
+	kill = []
+	for instruction in instructions:
+		instruction_uses = uses(instruction)
+		instruction_defs = defs(instruction)
+		gen.append(tracked & instruction_uses if instruction_uses is not None else set())
+		kill.append(tracked & instruction_defs if instruction_defs is not None else set())
+	live_in = [set() for _ in instructions]
+	live_out = [set() for _ in instructions]
+	changed = True
+	while changed:
+		changed = False
+		for i in reversed(range(len(instructions))):
+			out = set()
+			for succ in succs[i]:
+				out |= live_in[succ]
+			new_in = gen[i] | (out - kill[i])
+			if out != live_out[i] or new_in != live_in[i]:
+				live_out[i] = out
+				live_in[i] = new_in
+				changed = True
+	return live_in, live_out
+
+def splice(function, start, end, new_instructions):
+	"""
+	replace function.instructions[start:end] with new_instructions, whose jump targets must already
+	be in the new numbering; jumps into the replaced range go to its start
+	"""
+	delta = len(new_instructions) - (end - start)
+	
+	def mapping(offset):
+		if offset < start:
+			return offset
+		elif offset < end:
+			return start
+		return offset + delta
+	
+	retarget(function, mapping)
+	function.instructions[start:end] = new_instructions
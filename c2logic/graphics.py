@@ -0,0 +1,303 @@
+from .consts import max_graphics_buffer
+from .flow import defs, is_retaddr, jump_targets, retarget, remove_instructions, successors, uses
+from .instructions import Draw, DrawFlush, Return
+
+#draw commands that change how later commands draw instead of drawing anything
+state_cmds = ("color", "stroke")
+
+def is_state_change(instruction):
+	return isinstance(instruction, Draw) and instruction.cmd in state_cmds
+
+def is_call(instruction):
+	""" whether instruction sets the return address of a call, which starts it """
+	return is_retaddr(instruction)
+
+def get_callee(instruction):
+	return instruction.dest[len("__retaddr_"):]
+
+def return_points(function):
+	""" offsets that calls made by function return to """
+	return {instruction.src for instruction in function.instructions if is_retaddr(instruction)}
+
+def transfer_state(state, instruction):
+	""" the draw state after instruction, given the one before it """
+	if is_state_change(instruction):
+		return {**state, instruction.cmd: instruction}
+	written = defs(instruction)
+	#the next batch may be flushed to another display, and calls may change the state
+	if isinstance(instruction, DrawFlush) or written is None or uses(instruction) is None:
+		return {}
+	return {cmd: draw for cmd, draw in state.items() if not written & draw.uses()}
+
+def draw_states(function):
+	""" the state changes known to be in effect before each instruction, None if unreachable """
+	instructions = function.instructions
+	returns = return_points(function)
+	states = [None] * len(instructions)
+	if instructions:
+		states[0] = {}
+	worklist = [0] if instructions else []
+	while worklist:
+		i = worklist.pop()
+		out = transfer_state(states[i], instructions[i])
+		for succ in successors(function, i):
+			incoming = {} if succ in returns else out
+			old = states[succ]
+			if old is None:
+				states[succ] = incoming
+			else:
+				states[succ] = {
+					cmd: draw
+					for cmd, draw in old.items()
+					if cmd in incoming and str(incoming[cmd]) == str(draw)
+				}
+				if len(states[succ]) == len(old):
+					continue
+			worklist.append(succ)
+	return states
+
+def remove_redundant_draw_state(function):
+	"""
+	remove draw color and stroke commands setting what's already in effect, or overwritten before
+	anything is drawn, returns whether anything was removed
+	"""
+	instructions = function.instructions
+	states = draw_states(function)
+	targets = jump_targets(function)
+	redundant = set()
+	for i, instruction in enumerate(instructions):
+		if not is_state_change(instruction) or states[i] is None:
+			continue
+		known = states[i].get(instruction.cmd)
+		if known is not None and str(known) == str(instruction):
+			redundant.add(i)
+			continue
+		#overwritten before being used, within the same block
+		for j in range(i + 1, len(instructions)):
+			following = instructions[j]
+			if j in targets or isinstance(following, DrawFlush) or uses(following) is None:
+				break
+			if isinstance(following, Draw) and following.cmd == instruction.cmd:
+				#the same command is removed instead, as it's already in effect
+				if str(following) != str(instruction):
+					redundant.add(i)
+				break
+			if isinstance(following, Draw) and following.cmd not in state_cmds:
+				break
+			if successors(function, j) != [j + 1]:
+				break
+	return remove_instructions(function, redundant)
+
+def join_pending(a, b):
+	if a is None:
+		return b
+	if b is None:
+		return a
+	return max(a, b)
+
+class PendingDraws():
+	"""
+	how many draw commands can be buffered before each instruction of each function
+	counts are pairs of the most along paths that flushed since the function was called, counted
+	from the last flush, and those that didn't, counted from the call, or None if there are none
+	"""
+	def __init__(self, functions, limit=max_graphics_buffer):
+		self.functions = functions
+		self.limit = limit
+		self.summaries = {}
+		self.peaks = {}
+	
+	def cap(self, count):
+		return None if count is None else min(count, self.limit)
+	
+	def transfer(self, pending, instruction):
+		flushed, unflushed = pending
+		if isinstance(instruction, DrawFlush):
+			return (0, None)
+		elif isinstance(instruction, Draw):
+			return (self.cap(flushed + 1), self.cap(None if unflushed is None else unflushed + 1))
+		return pending
+	
+	def call(self, pending, func_name):
+		""" the count after calling func_name """
+		flushed, unflushed = pending
+		callee_flushed, callee_unflushed = self.summary(func_name)
+		if callee_unflushed is None:
+			return (callee_flushed, None)
+		return (
+			self.cap(max(callee_flushed, flushed + callee_unflushed)),
+			None if unflushed is None else self.cap(unflushed + callee_unflushed)
+		)
+	
+	def summary(self, func_name):
+		""" the count when func_name returns """
+		if func_name not in self.summaries:
+			self.summarize(func_name)
+		return self.summaries[func_name]
+	
+	def peak(self, func_name):
+		""" the most commands func_name adds before it flushes, None if it always flushes first """
+		if func_name not in self.peaks:
+			self.summarize(func_name)
+		return self.peaks[func_name]
+	
+	def summarize(self, func_name):
+		#recursive calls are assumed not to draw
+		self.summaries[func_name] = (0, 0)
+		self.peaks[func_name] = 0
+		function = self.functions.get(func_name)
+		if function is None:
+			return
+		summary = (0, None)
+		peak = None
+		pending = self.counts(function)
+		for i, instruction in enumerate(function.instructions):
+			if pending[i] is None:
+				continue
+			flushed, unflushed = pending[i]
+			if isinstance(instruction, Return):
+				summary = (max(summary[0], flushed), join_pending(summary[1], unflushed))
+			elif isinstance(instruction, Draw):
+				peak = join_pending(peak, unflushed)
+			elif is_call(instruction) and unflushed is not None:
+				callee_peak = self.peak(get_callee(instruction))
+				if callee_peak is not None:
+					peak = join_pending(peak, self.cap(unflushed + callee_peak))
+		self.summaries[func_name] = summary
+		self.peaks[func_name] = peak
+	
+	def counts(self, function):
+		""" the count before each instruction of function, None if unreachable """
+		instructions = function.instructions
+		pending = [None] * len(instructions)
+		if instructions:
+			pending[0] = (0, 0)
+		worklist = [0] if instructions else []
+		while worklist:
+			i = worklist.pop()
+			instruction = instructions[i]
+			out = self.transfer(pending[i], instruction)
+			for succ in successors(function, i):
+				incoming = out
+				if is_call(instruction) and succ == instruction.src:
+					incoming = self.call(out, get_callee(instruction))
+				old = pending[succ]
+				new = incoming if old is None else (
+					max(old[0], incoming[0]), join_pending(old[1], incoming[1])
+				)
+				if new != old:
+					pending[succ] = new
+					worklist.append(succ)
+		return pending
+	
+	def invalidate(self):
+		self.summaries = {}
+		self.peaks = {}
+	
+	def overflows(self, pending, instruction):
+		""" whether instruction draws past the limit if the buffer holds pending commands """
+		if isinstance(instruction, Draw):
+			return buffered(pending) >= self.limit
+		elif is_call(instruction) and buffered(pending) > 0:
+			#flushing before the call helps if the callee doesn't overflow by itself
+			peak = self.peak(get_callee(instruction))
+			return peak is not None and buffered(pending) + peak >= self.limit
+		return False
+
+def buffered(pending):
+	""" how many commands are buffered, if the buffer was empty when the function was called """
+	flushed, unflushed = pending
+	return max(flushed, unflushed or 0)
+
+def is_on_cycle(function, offset):
+	seen = set()
+	stack = list(successors(function, offset))
+	while stack:
+		i = stack.pop()
+		if i == offset:
+			return True
+		if i not in seen:
+			seen.add(i)
+			stack.extend(successors(function, i))
+	return False
+
+def flushed_displays(function, offset):
+	""" the displays of the drawflushes that the commands buffered at offset can be flushed by """
+	displays = set()
+	seen = set()
+	stack = [offset]
+	while stack:
+		i = stack.pop()
+		if i in seen:
+			continue
+		seen.add(i)
+		instruction = function.instructions[i]
+		if isinstance(instruction, DrawFlush):
+			displays.add(instruction.display)
+		else:
+			stack.extend(successors(function, i))
+	return displays
+
+def insert(function, offset, instruction):
+	""" insert instruction before offset, jumps to offset go to instruction """
+	retarget(function, lambda target: target if target <= offset else target + 1)
+	function.instructions.insert(offset, instruction)
+
+def callees_first(functions):
+	order = []
+	seen = set()
+	
+	def visit(name):
+		seen.add(name)
+		for callee in sorted(functions[name].callees):
+			if callee in functions and callee not in seen:
+				visit(callee)
+		order.append(name)
+	
+	for name in functions:
+		if name not in seen:
+			visit(name)
+	return order
+
+def split_draw_batches(functions, limit=max_graphics_buffer):
+	"""
+	insert a drawflush before draw commands that would be dropped because the buffer already holds
+	limit commands, assuming it's empty when each function is called
+	returns warnings for the ones that can't be split, because they're in a loop or it isn't known
+	which display they're drawn on
+	"""
+	warnings = []
+	pending_draws = PendingDraws(functions, limit)
+	for name in callees_first(functions):
+		function = functions[name]
+		skipped = set()
+		while True:
+			pending = pending_draws.counts(function)
+			overflows = [
+				i
+				for i, instruction in enumerate(function.instructions) if pending[i] is not None and
+				i not in skipped and pending_draws.overflows(pending[i], instruction)
+			]
+			if not overflows:
+				break
+			offset = overflows[0]
+			displays = flushed_displays(function, offset)
+			if is_on_cycle(function, offset):
+				warning = (
+					f"{name}: draw commands in a loop may overflow the buffer of {limit} before "
+					"being flushed"
+				)
+				if warning not in warnings:
+					warnings.append(warning)
+				skipped.update(i for i in overflows if is_on_cycle(function, i))
+			elif len(displays) != 1:
+				warnings.append(
+					f"{name}: over {limit} draw commands may be buffered, but which display they're "
+					"flushed to isn't known"
+				)
+				skipped.add(offset)
+			else:
+				flush = DrawFlush(displays.pop()).replaces(function.instructions[offset])
+				insert(function, offset, flush)
+				pending_draws.invalidate()
+	return warnings
@@ -0,0 +1,149 @@
+import copy
+
+from .flow import (
+	is_retaddr, liveness, local_names, param_names, remove_instructions, rename, splice
+)
+from .instructions import FunctionCall, Goto, JumpCondition, RawAsm, RelativeJump, Return
+
+def call_order(functions, root="main"):
+	""" functions reachable from root, callees before their callers """
+	order = []
+	seen = {root}
+	stack = [(root, iter(sorted(functions[root].callees)))]
+	while stack:
+		name, callees = stack[-1]
+		for callee in callees:
+			if callee not in seen and callee in functions:
+				seen.add(callee)
+				stack.append((callee, iter(sorted(functions[callee].callees))))
+				break
+		else:
+			stack.pop()
+			order.append(name)
+	return order
+
+def is_recursive(functions, function):
+	seen = set()
+	stack = list(function.callees)
+	while stack:
+		name = stack.pop()
+		if name == function.name:
+			return True
+		if name in seen or name not in functions:
+			continue
+		seen.add(name)
+		stack.extend(functions[name].callees)
+	return False
+
+def call_sites(function, callee_name):
+	return [
+		i for i, instruction in enumerate(function.instructions)
+		if isinstance(instruction, FunctionCall) and instruction.func_name == callee_name
+	]
+
+def can_inline(functions, function):
+	if function.name == "main" or not function.instructions or "__start" in function.callers:
+		return False
+	if any(isinstance(instruction, RawAsm) for instruction in function.instructions):
+		return False
+	return not is_recursive(functions, function)
+
+def inline_functions(
+	functions: dict,
+	threshold: int,
+	max_instructions: int,
+	shrink_only=False,
+	hot=frozenset(),
+	cold=frozenset(),
+	root="main"
+):
+	"""
+	splice small or single call site functions into their callers, or with shrink_only, functions
+	where that makes the program smaller regardless of threshold
+	hot functions are inlined regardless of threshold and cold ones as if shrink_only, when profiled
+	uses the callers/callees graph, so this must run before it is pruned
+	"""
+	total = sum(len(function.instructions) for function in functions.values())
+	for name in call_order(functions, root):
+		callee = functions[name]
+		if not can_inline(functions, callee):
+			continue
+		sites = {
+			caller: call_sites(functions[caller], name)
+			for caller in sorted(callee.callers) if caller in functions
+		}
+		num_sites = sum(map(len, sites.values()))
+		size = len(callee.instructions)
+		#each call site loses the return address and call, the original function is removed
+		growth = num_sites * (size - 2) - size
+		if num_sites == 0 or ((shrink_only or name in cold) and growth > 0):
+			continue
+		if size > threshold and num_sites > 1 and not (shrink_only or name in cold | hot):
+			continue
+		if total + growth > max_instructions:
+			continue
+		total += growth
+		for caller_name, offsets in sites.items():
+			caller = functions[caller_name]
+			for offset in reversed(offsets):
+				inline_call(caller, callee, offset)
+			rename_callee_vars(caller, callee)
+			caller.callees.discard(name)
+			caller.callees |= callee.callees
+			for callee_callee in callee.callees:
+				functions[callee_callee].callers.add(caller_name)
+		for callee_callee in callee.callees:
+			functions[callee_callee].callers.discard(name)
+		callee.callers.clear()
+		callee.callees.clear()
+		#nothing calls it anymore, so drop its copy of the code instead of keeping it until pruning
+		callee.instructions = []
+
+def inline_call(caller, callee, offset):
+	""" replace the return address setup and call at offset with a copy of callee """
+	start = offset - 1  # set __retaddr
+	end = start + len(callee.instructions)
+	body = []
+	labels = {}
+	for instruction in callee.instructions:
+		instruction = copy.copy(instruction)
+		if isinstance(instruction, RelativeJump):
+			instruction.offset += start
+		elif is_retaddr(instruction):
+			instruction.src += start
+		elif isinstance(instruction, Goto):
+			label = f"{callee.name}.{start}.{instruction.label}"
+			labels[label] = callee.labels[instruction.label] + start
+			instruction.label = label
+		elif isinstance(instruction, Return):
+			instruction = RelativeJump(end, JumpCondition.always).replaces(instruction)
+		body.append(instruction)
+	splice(caller, start, offset + 1, body)
+	#labels are added after splicing so they aren't shifted
+	for label, label_offset in labels.items():
+		caller.labels[label] = label_offset
+	last = caller.instructions[end - 1]
+	if isinstance(last, RelativeJump) and last.offset == end:
+		remove_instructions(caller, {end - 1})
+
+def rename_callee_vars(caller, callee):
+	"""
+	give the callee's locals names private to the caller so they can be optimized with its own
+	locals read before being written keep their name, as they hold state between calls
+	"""
+	callee_vars = local_names(callee)
+	live_in, _ = liveness(callee, callee_vars)
+	persistent = (live_in[0] if live_in else set()) - param_names(callee)
+	mapping = {}
+	caller_locals = set(caller.locals)
+	for name in callee.locals:
+		var = f"_{name}_{callee.name}"
+		if var in persistent:
+			continue
+		local_name = f"{callee.name}.{name}"
+		if local_name not in caller_locals:
+			caller.locals.append(local_name)
+			caller_locals.add(local_name)
+		mapping[var] = f"_{local_name}_{caller.name}"
+	for instruction in caller.instructions:
+		rename(instruction, mapping)
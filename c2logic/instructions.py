@@ -2,22 +2,71 @@ from dataclasses import dataclass
 from .consts import binary_op_inverses, binary_ops, condition_ops, unary_ops
 
 class Instruction:
-	pass
+	"""
+	an mlog instruction, fields are the names of its operands in order
+	dests and srcs are the fields holding variables it writes and reads
+	coord is the pycparser Coord of the C source it was compiled from, None if it has none
+	"""
+	__slots__ = ("coord", )
+	opcode: str = None
+	fields: tuple = ()
+	dests: tuple = ()
+	srcs: tuple = ()
+	
+	def __init__(self):
+		self.coord = None
+	
+	def replaces(self, instruction):
+		""" give self the source position of instruction, which it takes the place of """
+		self.coord = instruction.coord
+		return self
+	
+	def operands(self):
+		return tuple(getattr(self, field) for field in self.fields)
+	
+	def defs(self):
+		""" variables written, None if unknown """
+		return {getattr(self, field) for field in self.dests}
+	
+	def uses(self):
+		""" variables read, None if unknown """
+		return {getattr(self, field) for field in self.srcs}
 
 class Noop(Instruction):
+	__slots__ = ()
+	opcode = "noop"
+	
 	def __str__(self):
 		return "noop"
 
 class Set(Instruction):
+	__slots__ = ("dest", "src")
+	opcode = "set"
+	fields = ("dest", "src")
+	dests = ("dest", )
+	srcs = ("src", )
+	
 	def __init__(self, dest: str, src: str):
+		super().__init__()
 		self.src = src
 		self.dest = dest
 	
+	def uses(self):
+		#the function relative address set before a call isn't a variable
+		return set() if self.dest.startswith("__retaddr") else {self.src}
+	
 	def __str__(self):
 		return f"set {self.dest} {self.src}"
 
 class BinaryOp(Instruction):
+	__slots__ = ("op", "dest", "left", "right")
+	opcode = "op"
+	fields = ("op", "dest", "left", "right")
+	dests = ("dest", )
+	srcs = ("left", "right")
+	
 	def __init__(self, dest: str, left: str, right: str, op: str):
+		super().__init__()
 		self.left = left
 		self.right = right
 		self.op = op
@@ -30,7 +79,14 @@ class BinaryOp(Instruction):
 		return f"op {binary_ops[self.op]} {self.dest} {self.left} {self.right}"
 
 class UnaryOp(Instruction):
+	__slots__ = ("op", "dest", "src")
+	opcode = "op"
+	fields = ("op", "dest", "src")
+	dests = ("dest", )
+	srcs = ("src", )
+	
 	def __init__(self, dest: str, src: str, op: str):
+		super().__init__()
 		self.src = src
 		self.dest = dest
 		self.op = op
@@ -56,31 +112,77 @@ class JumpCondition:
 JumpCondition.always = JumpCondition("==", "0", "0")
 
 class RelativeJump(Instruction):
-	def __init__(self, offset: int, cond: JumpCondition):
+	__slots__ = ("offset", "func_start", "cond", "likely")
+	opcode = "jump"
+	fields = ("offset", "cond")
+	
+	def __init__(self, offset: int, cond: JumpCondition, likely: bool = None):
+		super().__init__()
 		self.offset = offset
 		self.func_start: int = None
 		self.cond = cond
+		#whether the jump is expected to be taken, None if nothing hints either way
+		self.likely = likely
+	
+	def uses(self):
+		return {self.cond.left, self.cond.right}
 	
 	def __str__(self):
 		return f"jump {self.func_start + self.offset} {self.cond}"
 
+class ComputedJump(Instruction):
+	""" jump to the index-th of the size instructions following this one """
+	__slots__ = ("index", "size")
+	opcode = "op"
+	fields = ("index", "size")
+	srcs = ("index", )
+	
+	def __init__(self, index: str, size: int):
+		super().__init__()
+		self.index = index
+		self.size = size
+	
+	def __str__(self):
+		return f"op add @counter @counter {self.index}"
+
 class FunctionCall(Instruction):
+	__slots__ = ("func_name", "func_start")
+	opcode = "jump"
+	fields = ("func_name", )
+	
 	def __init__(self, func_name: str):
+		super().__init__()
 		self.func_name = func_name
 		self.func_start: int = None
 	
+	def uses(self):
+		return None
+	
 	def __str__(self):
 		return f"jump {self.func_start} {JumpCondition.always}"
 
 class Return(Instruction):
+	__slots__ = ("func_name", )
+	opcode = "set"
+	fields = ("func_name", )
+	
 	def __init__(self, func_name: str):
+		super().__init__()
 		self.func_name = func_name
 	
+	def uses(self):
+		return None
+	
 	def __str__(self):
 		return f"set @counter __retaddr_{self.func_name}"
 
 class Goto(Instruction):
+	__slots__ = ("label", "offset", "func_start")
+	opcode = "jump"
+	fields = ("label", )
+	
 	def __init__(self, label: str):
+		super().__init__()
 		self.label = label
 		self.offset: int = None
 		self.func_start: int = None
@@ -89,23 +191,42 @@ class Goto(Instruction):
 		return f"jump {self.func_start + self.offset} {JumpCondition.always}"
 
 class Print(Instruction):
+	__slots__ = ("val", )
+	opcode = "print"
+	fields = ("val", )
+	srcs = ("val", )
+	
 	def __init__(self, val: str):
+		super().__init__()
 		self.val = val
 	
 	def __str__(self):
 		return f"print {self.val}"
 
 class PrintFlush(Instruction):
+	__slots__ = ("message", )
+	opcode = "printflush"
+	fields = ("message", )
+	srcs = ("message", )
+	
 	def __init__(self, message: str):
+		super().__init__()
 		self.message = message
 	
 	def __str__(self):
 		return f"printflush {self.message}"
 
 class Radar(Instruction):
+	__slots__ = ("target1", "target2", "target3", "sort", "src", "index", "dest")
+	opcode = "radar"
+	fields = ("target1", "target2", "target3", "sort", "src", "index", "dest")
+	dests = ("dest", )
+	srcs = ("src", "index")
+	
 	def __init__(
 		self, dest: str, src: str, target1: str, target2: str, target3: str, sort: str, index: str
 	):
+		super().__init__()
 		self.src = src
 		self.dest = dest
 		self.target1 = target1
@@ -115,10 +236,18 @@ class Radar(Instruction):
 		self.index = index
 	
 	def __str__(self):
-		return f"radar {self.target1} {self.target2} {self.target3} {self.sort} {self.src} {self.index} {self.dest}"
+		targets = f"{self.target1} {self.target2} {self.target3}"
+		return f"radar {targets} {self.sort} {self.src} {self.index} {self.dest}"
 
 class Sensor(Instruction):
+	__slots__ = ("dest", "src", "prop")
+	opcode = "sensor"
+	fields = ("dest", "src", "prop")
+	dests = ("dest", )
+	srcs = ("src", )
+	
 	def __init__(self, dest: str, src: str, prop: str):
+		super().__init__()
 		self.dest = dest
 		self.src = src
 		self.prop = prop
@@ -127,7 +256,13 @@ class Sensor(Instruction):
 		return f"sensor {self.dest} {self.src} @{self.prop}"
 
 class Enable(Instruction):
+	__slots__ = ("obj", "enabled")
+	opcode = "control"
+	fields = ("obj", "enabled")
+	srcs = ("obj", "enabled")
+	
 	def __init__(self, obj: str, enabled: str):
+		super().__init__()
 		self.obj = obj
 		self.enabled = enabled
 	
@@ -135,7 +270,13 @@ class Enable(Instruction):
 		return f"control enabled {self.obj} {self.enabled} 0 0 0"
 
 class Shoot(Instruction):
+	__slots__ = ("obj", "x", "y", "shoot")
+	opcode = "control"
+	fields = ("obj", "x", "y", "shoot")
+	srcs = ("obj", "x", "y", "shoot")
+	
 	def __init__(self, obj: str, x: str, y: str, shoot: str):
+		super().__init__()
 		self.obj = obj
 		self.x = x
 		self.y = y
@@ -145,7 +286,14 @@ class Shoot(Instruction):
 		return f"control shoot {self.obj} {self.x} {self.y} {self.shoot} 0"
 
 class GetLink(Instruction):
+	__slots__ = ("dest", "index")
+	opcode = "getlink"
+	fields = ("dest", "index")
+	dests = ("dest", )
+	srcs = ("index", )
+	
 	def __init__(self, dest: str, index: str):
+		super().__init__()
 		self.dest = dest
 		self.index = index
 	
@@ -153,7 +301,14 @@ class GetLink(Instruction):
 		return f"getlink {self.dest} {self.index}"
 
 class Read(Instruction):
+	__slots__ = ("dest", "src", "index")
+	opcode = "read"
+	fields = ("dest", "src", "index")
+	dests = ("dest", )
+	srcs = ("src", "index")
+	
 	def __init__(self, dest: str, src: str, index: str):
+		super().__init__()
 		self.dest = dest
 		self.src = src
 		self.index = index
@@ -162,7 +317,13 @@ class Read(Instruction):
 		return f"read {self.dest} {self.src} {self.index}"
 
 class Write(Instruction):
+	__slots__ = ("src", "dest", "index")
+	opcode = "write"
+	fields = ("src", "dest", "index")
+	srcs = ("src", "dest", "index")
+	
 	def __init__(self, src: str, dest: str, index: str):
+		super().__init__()
 		self.dest = dest
 		self.src = src
 		self.index = index
@@ -171,28 +332,61 @@ class Write(Instruction):
 		return f"write {self.src} {self.dest} {self.index}"
 
 class Draw(Instruction):
+	__slots__ = ("cmd", "args")
+	opcode = "draw"
+	fields = ("cmd", "args")
+	
 	def __init__(self, cmd: str, *args):
+		super().__init__()
 		self.cmd = cmd
 		self.args = args
 	
+	def operands(self):
+		return (self.cmd, *self.args)
+	
+	def uses(self):
+		return set(self.args)
+	
 	def __str__(self):
 		args = list(self.args) + ['0'] * (6 - len(self.args))
 		return f"draw {self.cmd} {' '.join(args)}"
 
 class DrawFlush(Instruction):
+	__slots__ = ("display", )
+	opcode = "drawflush"
+	fields = ("display", )
+	srcs = ("display", )
+	
 	def __init__(self, display: str):
+		super().__init__()
 		self.display = display
 	
 	def __str__(self):
 		return f"drawflush {self.display}"
 
 class End(Instruction):
+	__slots__ = ()
+	opcode = "end"
+	
+	def uses(self):
+		return None
+	
 	def __str__(self):
 		return "end"
 
 class RawAsm(Instruction):
+	__slots__ = ("code", )
+	fields = ("code", )
+	
 	def __init__(self, code: str):
+		super().__init__()
 		self.code = code
 	
+	def defs(self):
+		return None
+	
+	def uses(self):
+		return None
+	
 	def __str__(self):
 		return self.code
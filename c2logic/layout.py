@@ -0,0 +1,214 @@
+import dataclasses
+from dataclasses import dataclass
+
+from .consts import binary_op_inverses
+from .flow import (
+	falls_through, is_conditional_jump, is_unconditional_jump, jump_target, jump_targets, retarget,
+	successors, table_entries
+)
+from .instructions import JumpCondition, RelativeJump
+
+#probability of taking a jump hinted likely by __builtin_expect or the profile, or that loops back
+likely_probability = 0.9
+#probability of going to a block that returns or ends when the other successor doesn't
+exit_probability = 0.25
+#how many times a loop runs each time it's entered
+loop_scale = 10
+
+@dataclass
+class Block():
+	"""
+	instructions[start:end] of a function, which are only jumped into at start, other than the
+	entries of a jump table ending the block
+	"""
+	start: int
+	end: int
+	#starts of the blocks control can go to next, and the probability of each
+	succs: dict = dataclasses.field(default_factory=dict)
+	preds: list = dataclasses.field(default_factory=list)
+	#estimated runs per call of the function
+	frequency: float = 0
+
+def control_flow_graph(function):
+	""" the basic blocks of function by start, in the order they're laid out """
+	instructions = function.instructions
+	leaders = {0} | jump_targets(function)
+	for i, instruction in enumerate(instructions):
+		if isinstance(instruction, RelativeJump) or not falls_through(instruction):
+			leaders.add(i + 1)
+	#jump tables stay with their computed jump
+	leaders = sorted(
+		leader for leader in leaders - table_entries(function) if leader < len(instructions)
+	)
+	blocks = {}
+	for start, end in zip(leaders, leaders[1:] + [len(instructions)]):
+		blocks[start] = Block(start, end)
+	for block in blocks.values():
+		for i in range(block.start, block.end):
+			for succ in successors(function, i):
+				if not block.start < succ < block.end and succ not in block.succs:
+					block.succs[succ] = None
+					blocks[succ].preds.append(block.start)
+	return blocks
+
+def depth_first_order(blocks):
+	""" starts of the blocks reachable from the entry in reverse postorder, and the back edges """
+	postorder = []
+	back_edges = set()
+	#True while a block's successors are being visited, False once they're done
+	visiting = {0: True}
+	stack = [(0, iter(blocks[0].succs))]
+	while stack:
+		start, succs = stack[-1]
+		for succ in succs:
+			if succ not in visiting:
+				visiting[succ] = True
+				stack.append((succ, iter(blocks[succ].succs)))
+				break
+			elif visiting[succ]:
+				back_edges.add((start, succ))
+		else:
+			stack.pop()
+			visiting[start] = False
+			postorder.append(start)
+	return postorder[::-1], back_edges
+
+def taken_probability(function, blocks, block, back_edges):
+	""" the probability of the conditional jump ending block being taken """
+	jump = function.instructions[block.end - 1]
+	taken, fallthrough = jump.offset, block.end
+	if jump.likely is not None:
+		return likely_probability if jump.likely else 1 - likely_probability
+	#loops usually run again
+	if (block.start, taken) in back_edges:
+		return likely_probability
+	if (block.start, fallthrough) in back_edges:
+		return 1 - likely_probability
+	#returns and ends taken early are usually error or special cases
+	taken_exits = not blocks[taken].succs
+	fallthrough_exits = not blocks[fallthrough].succs
+	if taken_exits != fallthrough_exits:
+		return exit_probability if taken_exits else 1 - exit_probability
+	return 0.5
+
+def estimate_frequencies(function, blocks):
+	""" fill in the probability of each edge and the frequency of each block """
+	order, back_edges = depth_first_order(blocks)
+	for block in blocks.values():
+		if is_conditional_jump(function.instructions[block.end - 1]) and len(block.succs) == 2:
+			probability = taken_probability(function, blocks, block, back_edges)
+			block.succs[function.instructions[block.end - 1].offset] = probability
+			block.succs[block.end] = 1 - probability
+		else:
+			for succ in block.succs:
+				block.succs[succ] = 1 / len(block.succs)
+	for start in order:
+		block = blocks[start]
+		block.frequency = sum(
+			blocks[pred].frequency * blocks[pred].succs[start]
+			for pred in block.preds if (pred, start) not in back_edges
+		)
+		if start == 0:
+			block.frequency += 1
+		if any((pred, start) in back_edges for pred in block.preds):
+			block.frequency *= loop_scale
+
+def fallthrough_weight(function, block):
+	"""
+	jumps saved per call by placing a successor of block after it, None if it can't fall through
+	a conditional jump can fall through to either successor, otherwise a jump is needed for one
+	"""
+	last = function.instructions[block.end - 1]
+	if len(block.succs) == 2 and is_conditional_jump(last):
+		return block.frequency * min(block.succs.values())
+	if len(block.succs) == 1 and (falls_through(last) or is_unconditional_jump(last)):
+		return block.frequency
+	return None
+
+def is_cold(function, blocks, block):
+	""" whether every way into block is a conditional jump, or not taking one, that's unlikely """
+	return bool(block.preds) and all(
+		is_conditional_jump(function.instructions[blocks[pred].end -
+		1]) and blocks[pred].succs[block.start] < 0.5 for pred in block.preds
+	)
+
+def invert(jump, target):
+	""" make jump go to target when it would've fallen through, and fall through otherwise """
+	cond = jump.cond
+	jump.cond = JumpCondition(binary_op_inverses[cond.op], cond.left, cond.right)
+	jump.offset = target
+	if jump.likely is not None:
+		jump.likely = not jump.likely
+
+def chain_blocks(function, blocks):
+	"""
+	greedily link blocks into chains that fall through from one block to the next, heaviest
+	edges first and preferring the current order on ties, returns the starts of the blocks in order
+	the chain of the entry is placed first, and the chains only entered through unlikely jumps last
+	"""
+	chain_of = {start: [start] for start in blocks}
+	edges = []
+	for block in blocks.values():
+		weight = fallthrough_weight(function, block)
+		if weight is not None:
+			edges.extend((-weight, succ != block.end, block.start, succ) for succ in block.succs)
+	for _, _, start, succ in sorted(edges):
+		chain = chain_of[start]
+		succ_chain = chain_of[succ]
+		if succ == 0 or chain is succ_chain or chain[-1] != start or succ_chain[0] != succ:
+			continue
+		chain.extend(succ_chain)
+		for moved in succ_chain:
+			chain_of[moved] = chain
+	chains = [chain_of[start] for start in blocks if chain_of[start][0] == start]
+	chains.sort(key=lambda chain: (chain[0] != 0, is_cold(function, blocks, blocks[chain[0]])))
+	return [start for chain in chains for start in chain]
+
+def layout_blocks(function):
+	"""
+	reorder the basic blocks of function so likely successors follow each other instead of being
+	jumped to, and early exits and other unlikely paths are moved out of line
+	which successor is likely comes from __builtin_expect, the profile and heuristics
+	returns whether anything moved
+	"""
+	instructions = function.instructions
+	if not instructions or falls_through(instructions[-1]):
+		return False
+	#jumps into the middle of a jump table would be into the middle of a block
+	entries = table_entries(function)
+	if any(jump_target(function, instruction) in entries for instruction in instructions):
+		return False
+	blocks = control_flow_graph(function)
+	estimate_frequencies(function, blocks)
+	order = chain_blocks(function, blocks)
+	if order == list(blocks):
+		return False
+	new_instructions = []
+	new_offsets = {}
+	for i, start in enumerate(order):
+		block = blocks[start]
+		for offset in range(block.start, block.end):
+			new_offsets[offset] = len(new_instructions)
+			new_instructions.append(instructions[offset])
+		following = order[i + 1] if i + 1 < len(order) else None
+		last = instructions[block.end - 1]
+		if following == block.end:
+			continue
+		if is_conditional_jump(last):
+			taken = last.offset
+			if following == taken:
+				invert(last, block.end)
+				continue
+			#the jump added for the successor that can't fall through goes to the less likely one
+			if block.succs.get(taken, 0) < block.succs.get(block.end, 0):
+				invert(last, block.end)
+				jump = RelativeJump(taken, JumpCondition.always)
+			else:
+				jump = RelativeJump(block.end, JumpCondition.always)
+			new_instructions.append(jump.replaces(last))
+		elif falls_through(last):
+			new_instructions.append(RelativeJump(block.end, JumpCondition.always).replaces(last))
+	new_offsets[len(instructions)] = len(new_instructions)
+	function.instructions = new_instructions
+	retarget(function, new_offsets.__getitem__)
+	return True
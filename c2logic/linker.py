@@ -0,0 +1,66 @@
+from .flow import is_retaddr
+from .instructions import FunctionCall, Goto, RelativeJump, Set
+
+def resolve_jump(instruction, function, functions):  #pylint: disable=unused-argument
+	instruction.func_start = function.start
+	return instruction
+
+def resolve_call(instruction, function, functions):  #pylint: disable=unused-argument
+	instruction.func_start = functions[instruction.func_name].start
+	return instruction
+
+def resolve_goto(instruction, function, functions):  #pylint: disable=unused-argument
+	instruction.offset = function.labels[instruction.label]
+	instruction.func_start = function.start
+	return instruction
+
+def resolve_set(instruction, function, functions):  #pylint: disable=unused-argument
+	if is_retaddr(instruction):
+		#the function relative address is kept, so the functions can still be analyzed and relinked
+		return Set(instruction.dest, instruction.src + function.start)
+	return instruction
+
+#instructions with function relative or symbolic targets, by exact type
+#each returns the instruction to emit, with its target made absolute
+resolvers = {
+	RelativeJump: resolve_jump,
+	FunctionCall: resolve_call,
+	Goto: resolve_goto,
+	Set: resolve_set
+}
+
+def link(functions: dict, preamble: list):
+	"""
+	place functions one after another following preamble and resolve every jump, call and return
+	address to an absolute position, returns the lines of the program
+	"""
+	offset = len(preamble)
+	for function in functions.values():
+		function.start = offset
+		offset += len(function.instructions)
+	lines = []
+	for instruction in preamble:
+		if isinstance(instruction, FunctionCall):
+			resolve_call(instruction, None, functions)
+		lines.append(str(instruction))
+	for function in functions.values():
+		for instruction in function.instructions:
+			resolve = resolvers.get(type(instruction))
+			if resolve is not None:
+				instruction = resolve(instruction, function, functions)
+			lines.append(str(instruction))
+	return lines
+
+def source_map(functions: dict, preamble: list):
+	""" (function name, Coord) of each line of the program link returns, None where it has none """
+	entries = [(None, instruction.coord) for instruction in preamble]
+	for function in functions.values():
+		entries.extend((function.name, instruction.coord) for instruction in function.instructions)
+	return entries
+
+def format_source_map(entries):
+	""" a line for each line of the program: its number, function and file:line:column, by tabs """
+	return "\n".join(
+		f"{i}\t{name or '-'}\t{'-' if coord is None else coord}"
+		for i, (name, coord) in enumerate(entries)
+	)
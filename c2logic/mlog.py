@@ -0,0 +1,82 @@
+import re
+
+from .consts import binary_ops, unary_ops
+from .instructions import (
+	BinaryOp, Draw, DrawFlush, Enable, End, GetLink, Noop, Print, PrintFlush, Radar, RawAsm, Read,
+	Sensor, Set, Shoot, UnaryOp, Write
+)
+
+token_re = re.compile(r'"[^"]*"|\S+')
+
+#mlog op names -> the C operators they're stored as
+binary_op_names = {name: op for op, name in binary_ops.items()}
+unary_op_names = {name: op for op, name in unary_ops.items()}
+
+def tokenize(line: str):
+	return token_re.findall(line)
+
+def is_control_flow(token: str):
+	return token == "@counter" or token.startswith("__retaddr")
+
+def parse_op(name, dest, left, right):
+	if name in binary_op_names:
+		return BinaryOp(dest, left, right, binary_op_names[name])
+	elif name in unary_op_names:
+		return UnaryOp(dest, left, unary_op_names[name])
+	return None
+
+def parse_sensor(dest, src, prop):
+	if not prop.startswith("@"):  # a variable holding the property
+		return None
+	return Sensor(dest, src, prop[1:])
+
+def parse_radar(target1, target2, target3, sort, src, index, dest):
+	return Radar(dest, src, target1, target2, target3, sort, index)
+
+def parse_control(cmd, obj, *args):
+	if cmd == "enabled":
+		return Enable(obj, args[0])
+	elif cmd == "shoot":
+		return Shoot(obj, *args[:3])
+	return None
+
+#opcode -> (operand count, function creating the Instruction or None if it isn't representable)
+parsers = {
+	"noop": (0, Noop),
+	"set": (2, Set),
+	"op": (4, parse_op),
+	"print": (1, Print),
+	"printflush": (1, PrintFlush),
+	"radar": (7, parse_radar),
+	"sensor": (3, parse_sensor),
+	"control": (6, parse_control),
+	"getlink": (2, GetLink),
+	"read": (3, Read),
+	"write": (3, Write),
+	"draw": (7, Draw),
+	"drawflush": (1, DrawFlush),
+	"end": (0, End)
+}
+
+def parse_line(line: str):
+	"""
+	the Instruction for a line of mlog, lines that can't be analyzed become RawAsm
+	these are jumps, whose targets are absolute, anything using @counter or return addresses and
+	unknown instructions
+	"""
+	tokens = tokenize(line)
+	if not tokens or tokens[0] not in parsers or any(map(is_control_flow, tokens)):
+		return RawAsm(line)
+	count, parser = parsers[tokens[0]]
+	operands = tokens[1:]
+	if len(operands) != count:
+		return RawAsm(line)
+	instruction = parser(*operands)
+	#instructions whose output differs, such as ones with unused operands that aren't 0
+	if instruction is None or str(instruction) != " ".join(tokens):
+		return RawAsm(line)
+	return instruction
+
+def parse(code: str):
+	""" the Instructions of each non empty line of mlog code """
+	return [parse_line(line.strip()) for line in code.splitlines() if line.strip()]
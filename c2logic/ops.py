@@ -0,0 +1,143 @@
+import math
+import random
+import re
+
+#mlog operator semantics, shared by the emulator and constant folding
+#see https://github.com/Anuken/Mindustry/blob/master/core/src/mindustry/logic/LogicOp.java
+
+def num(val):
+	if val is None:
+		return 0
+	if isinstance(val, (int, float)):
+		return val
+	return 1
+
+def to_long(val):
+	val = num(val)
+	if math.isnan(val):
+		return 0
+	if math.isinf(val):
+		return 2**63 - 1 if val > 0 else -2**63
+	return int(val)
+
+def wrap_long(val):
+	return float((val + 2**63) % 2**64 - 2**63)
+
+def is_obj(val):
+	return not isinstance(val, (int, float))
+
+def equal(left, right):
+	if is_obj(left) and is_obj(right):
+		return left == right
+	return abs(num(left) - num(right)) < 0.000001
+
+def strict_equal(left, right):
+	if is_obj(left) or is_obj(right):
+		return is_obj(left) and is_obj(right) and left == right
+	return left == right
+
+def div(left, right):
+	if right == 0:
+		if left == 0 or math.isnan(left):
+			return math.nan
+		return math.copysign(math.inf, left)
+	return left / right
+
+def mod(left, right):
+	if right == 0:
+		return math.nan
+	return math.fmod(left, right)
+
+def power(left, right):
+	try:
+		return math.pow(left, right)
+	except OverflowError:
+		return math.inf
+	except ValueError:
+		return math.nan
+
+def log(val, func=math.log):
+	if val < 0 or math.isnan(val):
+		return math.nan
+	if val == 0:
+		return -math.inf
+	return func(val)
+
+def angle(x, y):
+	return math.degrees(math.atan2(y, x)) % 360
+
+#mlog operator name -> implementation, operands are converted with num() except where noted
+binary_op_funcs = {
+	"add": lambda a, b: a + b,
+	"sub": lambda a, b: a - b,
+	"mul": lambda a, b: a * b,
+	"div": div,
+	"idiv": lambda a, b: float(math.floor(a / b)) if b != 0 else div(a, b),
+	"mod": mod,
+	"pow": power,
+	"land": lambda a, b: float(a != 0 and b != 0),
+	"lessThan": lambda a, b: float(a < b),
+	"lessThanEq": lambda a, b: float(a <= b),
+	"greaterThan": lambda a, b: float(a > b),
+	"greaterThanEq": lambda a, b: float(a >= b),
+	"shl": lambda a, b: wrap_long(to_long(a) << (to_long(b) & 63)),
+	"shr": lambda a, b: float(to_long(a) >> (to_long(b) & 63)),
+	"or": lambda a, b: float(to_long(a) | to_long(b)),
+	"and": lambda a, b: float(to_long(a) & to_long(b)),
+	"xor": lambda a, b: float(to_long(a) ^ to_long(b)),
+	"max": max,
+	"min": min,
+	"atan2": angle,
+	"angle": angle,
+	"dst": math.hypot,
+	"len": math.hypot,
+	"noise": lambda a, b: 0.0
+}
+#these compare the raw values instead of numbers
+object_op_funcs = {
+	"equal": lambda a, b: float(equal(a, b)),
+	"notEqual": lambda a, b: float(not equal(a, b)),
+	"strictEqual": lambda a, b: float(strict_equal(a, b))
+}
+
+unary_op_funcs = {
+	"not": lambda a: float(~to_long(a)),
+	"negate": lambda a: -a,
+	"abs": abs,
+	"log": log,
+	"log10": lambda a: log(a, math.log10),
+	"sin": lambda a: math.sin(math.radians(a)),
+	"cos": lambda a: math.cos(math.radians(a)),
+	"tan": lambda a: math.tan(math.radians(a)),
+	"floor": lambda a: float(math.floor(a)) if math.isfinite(a) else a,
+	"ceil": lambda a: float(math.ceil(a)) if math.isfinite(a) else a,
+	"sqrt": lambda a: math.sqrt(a) if a >= 0 else math.nan,
+	"rand": lambda a: random.random() * a
+}
+
+def eval_binary_op(op: str, left, right):
+	if op in object_op_funcs:
+		return object_op_funcs[op](left, right)
+	return float(binary_op_funcs[op](num(left), num(right)))
+
+def eval_unary_op(op: str, val):
+	return float(unary_op_funcs[op](num(val)))
+
+def eval_condition(op: str, left, right):
+	if op == "always":
+		return True
+	return eval_binary_op(op, left, right) != 0
+
+#float() also takes inf, nan and infinity, which are variable names in mlog
+number_re = re.compile(r"-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+hex_re = re.compile(r"-?0x[0-9a-fA-F]+")
+binary_re = re.compile(r"-?0b[01]+")
+
+def parse_number(token: str):
+	if hex_re.fullmatch(token):
+		return float(int(token, 16))
+	if binary_re.fullmatch(token):
+		return float(int(token, 2))
+	if number_re.fullmatch(token):
+		return float(token)
+	return None
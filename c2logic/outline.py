@@ -0,0 +1,89 @@
+from .flow import defs, is_retaddr, jump_targets, splice, table_entries, uses
+from .instructions import (
+	BinaryOp, Draw, DrawFlush, Enable, FunctionCall, GetLink, Print, PrintFlush, Radar, Read,
+	Return, Sensor, Set, Shoot, UnaryOp, Write
+)
+
+#instructions that don't depend on where they are, so they can be moved into a subroutine
+movable_types = (
+	Set, BinaryOp, UnaryOp, Print, PrintFlush, Radar, Sensor, Enable, Shoot, GetLink, Read, Write,
+	Draw, DrawFlush
+)
+
+#longest sequence considered for outlining
+max_length = 64
+
+def is_movable(instruction):
+	if not isinstance(instruction, movable_types) or is_retaddr(instruction):
+		return False
+	return "@counter" not in uses(instruction) | defs(instruction)
+
+def savings(length, count):
+	""" instructions saved by outlining count copies of a sequence """
+	#each copy becomes a return address and call, and the subroutine needs a return
+	return (count - 1) * length - 2 * count - 1
+
+def find_sequences(functions):
+	""" sequence of instruction strings -> [(function name, offset)] of each occurrence """
+	occurrences = {}
+	for function in functions.values():
+		lines = [
+			str(instruction) if is_movable(instruction) else None
+			for instruction in function.instructions
+		]
+		#jumps can only land on the first instruction of a sequence, and tables can't be moved
+		targets = jump_targets(function)
+		entries = table_entries(function)
+		for start in range(len(lines)):
+			if lines[start] is None or start in entries:
+				continue
+			for end in range(start + 1, min(len(lines), start + max_length)):
+				if lines[end] is None or end in entries or end in targets:
+					break
+				sequence = tuple(lines[start:end + 1])
+				occurrences.setdefault(sequence, []).append((function.name, start))
+	return occurrences
+
+def non_overlapping(sites, length):
+	kept = []
+	for name, start in sites:
+		if kept and kept[-1][0] == name and kept[-1][1] + length > start:
+			continue
+		kept.append((name, start))
+	return kept
+
+def outline(functions, new_function):
+	"""
+	replace repeated instruction sequences with calls to a subroutine holding one copy, as long
+	as it makes the program smaller
+	new_function(name) creates the empty Function for a subroutine
+	"""
+	count = 0
+	while True:
+		best = None
+		for sequence, sites in find_sequences(functions).items():
+			sites = non_overlapping(sites, len(sequence))
+			saved = savings(len(sequence), len(sites))
+			if saved > 0 and (best is None or saved > best[0]):
+				best = (saved, len(sequence), sites)
+		if best is None:
+			return count
+		_, length, sites = best
+		name = f"__outlined_{count}"
+		count += 1
+		first_name, first_start = sites[0]
+		subroutine = new_function(name)
+		first = functions[first_name].instructions
+		subroutine.instructions = first[first_start:first_start + length] + [Return(name)]
+		#replace later sites first so the offsets of earlier ones stay valid
+		for caller_name, start in reversed(sites):
+			caller = functions[caller_name]
+			replaced = caller.instructions[start]
+			call = [
+				Set(f"__retaddr_{name}", start + 2).replaces(replaced),
+				FunctionCall(name).replaces(replaced)
+			]
+			splice(caller, start, start + length, call)
+			caller.callees.add(name)
+			subroutine.callers.add(caller_name)
+		functions[name] = subroutine
@@ -0,0 +1,105 @@
+from .flow import (
+	defs, is_unconditional_jump, jump_target, jump_targets, reachable, remove_instructions,
+	table_entries, uses
+)
+from .instructions import BinaryOp, End, Goto, JumpCondition, RelativeJump, Return, Set, UnaryOp
+
+def optimize(function):
+	""" run the peephole passes on function until nothing changes """
+	lower_gotos(function)
+	changed = True
+	while changed:
+		changed = False
+		for opt in (
+			thread_jumps, remove_unreachable, remove_next_jumps, remove_redundant_sets,
+			remove_dead_rax
+		):
+			changed |= opt(function)
+
+def lower_gotos(function):
+	instructions = function.instructions
+	for i, instruction in enumerate(instructions):
+		if isinstance(instruction, Goto):
+			instructions[i] = RelativeJump(
+				function.labels[instruction.label], JumpCondition.always
+			).replaces(instruction)
+
+def thread_jumps(function):
+	""" retarget jumps that land on an unconditional jump, return or end """
+	changed = False
+	instructions = function.instructions
+	for i, instruction in enumerate(instructions):
+		if not isinstance(instruction, RelativeJump):
+			continue
+		target = instruction.offset
+		seen = {i}
+		while target < len(instructions) and target not in seen and is_unconditional_jump(
+			instructions[target]
+		):
+			seen.add(target)
+			target = jump_target(function, instructions[target])
+		if target != instruction.offset:
+			instruction.offset = target
+			changed = True
+		if instruction.cond == JumpCondition.always and target < len(instructions):
+			dest = instructions[target]
+			if isinstance(dest, Return):
+				instructions[i] = Return(dest.func_name).replaces(instruction)
+				changed = True
+			elif isinstance(dest, End):
+				instructions[i] = End().replaces(instruction)
+				changed = True
+	return changed
+
+def remove_unreachable(function):
+	live = reachable(function)
+	dead = set(range(len(function.instructions))) - live
+	return remove_instructions(function, dead)
+
+def remove_next_jumps(function):
+	entries = table_entries(function)
+	to_remove = {
+		i
+		for i, instruction in enumerate(function.instructions)
+		if isinstance(instruction, RelativeJump) and instruction.offset == i +
+		1 and i not in entries
+	}
+	return remove_instructions(function, to_remove)
+
+def remove_redundant_sets(function):
+	""" remove set a a, and set b a directly after set a b """
+	instructions = function.instructions
+	targets = jump_targets(function)
+	to_remove = set()
+	for i, instruction in enumerate(instructions):
+		if not isinstance(instruction, Set) or instruction.dest.startswith("@"):
+			continue
+		if instruction.dest == instruction.src:
+			to_remove.add(i)
+		elif i > 0 and i not in targets and i - 1 not in to_remove:
+			prev = instructions[i - 1]
+			if isinstance(
+				prev, Set
+			) and prev.dest == instruction.src and prev.src == instruction.dest:
+				to_remove.add(i)
+	return remove_instructions(function, to_remove)
+
+def remove_dead_rax(function):
+	""" remove writes to __rax that are overwritten before being read in the same block """
+	instructions = function.instructions
+	targets = jump_targets(function)
+	to_remove = set()
+	for i, instruction in enumerate(instructions):
+		if defs(instruction) != {"__rax"} or not isinstance(instruction, (Set, BinaryOp, UnaryOp)):
+			continue
+		for j in range(i + 1, len(instructions)):
+			following = instructions[j]
+			if j in targets or jump_target(function, following) is not None:
+				break
+			following_uses = uses(following)
+			if following_uses is None or "__rax" in following_uses:
+				break
+			if defs(following) == {"__rax"}:
+				to_remove.add(i)
+				break
+	return remove_instructions(function, to_remove)
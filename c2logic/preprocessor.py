@@ -0,0 +1,602 @@
+import os
+import re
+from dataclasses import dataclass
+
+import pycparser
+
+token_re = re.compile(
+	r"""
+	\s+
+	|[A-Za-z_]\w*
+	|\.?\d(?:[eEpP][+-]|[\w.])*
+	|L?"(?:[^"\\]|\\.)*"
+	|L?'(?:[^'\\]|\\.)*'
+	|\#\#|\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^!=]=
+	|.
+	""", re.VERBOSE | re.DOTALL
+)
+
+#precedence of the binary operators allowed in #if
+binary_precedence = {
+	"||": 1,
+	"&&": 2,
+	"|": 3,
+	"^": 4,
+	"&": 5,
+	"==": 6,
+	"!=": 6,
+	"<": 7,
+	">": 7,
+	"<=": 7,
+	">=": 7,
+	"<<": 8,
+	">>": 8,
+	"+": 9,
+	"-": 9,
+	"*": 10,
+	"/": 10,
+	"%": 10
+}
+
+#files read by any Preprocessor, by absolute path, along with the mtime and size they were read at
+file_cache = {}
+
+@dataclass
+class Macro():
+	name: str
+	#None for object-like macros
+	params: list
+	body: list
+	variadic: bool = False
+
+@dataclass
+class Line():
+	lineno: int
+	#directive name, or None for text
+	directive: str
+	tokens: list
+
+def tokenize(text):
+	return token_re.findall(text)
+
+def is_space(token):
+	return token.isspace()
+
+def is_identifier(token):
+	return token[0].isalpha() or token[0] == "_"
+
+def strip_spaces(tokens):
+	start = 0
+	end = len(tokens)
+	while start < end and is_space(tokens[start]):
+		start += 1
+	while end > start and is_space(tokens[end - 1]):
+		end -= 1
+	return tokens[start:end]
+
+def strip_comments(text):
+	""" replace comments with a space, keeping the newlines of block comments """
+	out = []
+	i = 0
+	while i < len(text):
+		char = text[i]
+		if char in "\"'":
+			end = i + 1
+			while end < len(text) and text[end] not in (char, "\n"):
+				end += 2 if text[end] == "\\" else 1
+			out.append(text[i:end + 1])
+			i = end + 1
+		elif text.startswith("//", i):
+			end = text.find("\n", i)
+			i = len(text) if end == -1 else end
+			out.append(" ")
+		elif text.startswith("/*", i):
+			end = text.find("*/", i + 2)
+			if end == -1:
+				raise ValueError("Unterminated comment")
+			out.append(" " + "\n" * text.count("\n", i, end))
+			i = end + 2
+		else:
+			end = i + 1
+			while end < len(text) and text[end] not in "\"'/":
+				end += 1
+			out.append(text[i:end])
+			i = end
+	return "".join(out)
+
+def read_lines(path):
+	""" the logical lines of a file, which are memoized until it changes """
+	stat = os.stat(path)
+	cached = file_cache.get(path)
+	if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+		return cached[1]
+	with open(path) as f:
+		text = f.read()
+	#splice lines ending in a backslash, keeping the number of the first one
+	physical = strip_comments(text.replace("\\\n", "\\\0\n")).split("\n")
+	lines = []
+	lineno = 1
+	text = ""
+	for i, line in enumerate(physical, 1):
+		if line.endswith("\\\0"):
+			text += line[:-2]
+			continue
+		text += line
+		stripped = text.lstrip()
+		if stripped.startswith("#"):
+			tokens = strip_spaces(tokenize(stripped[1:]))
+			directive = tokens[0] if tokens and is_identifier(tokens[0]) else ""
+			lines.append(Line(lineno, directive, strip_spaces(tokens[1:] if directive else tokens)))
+		elif stripped:
+			lines.append(Line(lineno, None, tokenize(text)))
+		text = ""
+		lineno = i + 1
+	file_cache[path] = ((stat.st_mtime_ns, stat.st_size), lines)
+	return lines
+
+def parse_int(token):
+	if token[0] in "L'":
+		value = token[token.index("'") + 1:-1]
+		return ord(value.encode().decode("unicode_escape")[0]) if value else 0
+	token = token.rstrip("uUlL")
+	if len(token) > 1 and token[0] == "0" and token[1] not in "xXbB":
+		return int(token, 8)
+	return int(token, 0)
+
+class Preprocessor():
+	"""
+	the subset of the C preprocessor c2logic programs need: #include, object and function-like
+	#define and #undef, and the #if family of conditionals
+	"""
+	def __init__(self, include_paths=(), defines=None):
+		self.include_paths = list(include_paths)
+		self.macros = {}
+		for name, body in {
+			"__STDC__": "1",
+			"__STDC_VERSION__": "201710L",
+			**(defines or {})
+		}.items():
+			self.macros[name] = Macro(name, None, strip_spaces(tokenize(body)))
+		self.once = set()
+		self.out = []
+		#file and line number the next line of out has in the source
+		self.path = None
+		self.lineno = None
+		#file and line number being expanded, for __FILE__ and __LINE__
+		self.location = (None, None)
+		self.include_depth = 0
+	
+	def preprocess(self, filename):
+		""" preprocessed text of filename, with cpp style line markers """
+		self.process_file(filename)
+		return "\n".join(self.out) + "\n"
+	
+	def process_file(self, path):
+		if os.path.abspath(path) in self.once:
+			return
+		self.include_depth += 1
+		if self.include_depth > 200:
+			raise ValueError(f"{path}: #include nested too deeply")
+		#mark every file read, like cpp, so the files a program depends on can be found
+		self.mark(path, 1)
+		#conditional stack of [currently active, a branch was taken, enclosing block active]
+		conditions = []
+		pending = None
+		for line in read_lines(os.path.abspath(path)):
+			active = all(condition[0] for condition in conditions)
+			if line.directive is None:
+				if not active:
+					continue
+				if pending is not None:
+					pending[1].append(" ")
+					pending[1].extend(line.tokens)
+				else:
+					pending = (line.lineno, list(line.tokens))
+				self.location = (path, pending[0])
+				expanded = self.expand(self.with_hidesets(pending[1]), True)
+				if expanded is not None:
+					self.emit(path, pending[0], expanded)
+					pending = None
+				continue
+			if pending is not None:
+				#a macro call's arguments can't contain directives, expand what is there
+				self.emit(path, pending[0], self.expand(self.with_hidesets(pending[1])))
+				pending = None
+			self.location = (path, line.lineno)
+			try:
+				self.process_directive(line, path, conditions, active)
+			except ValueError as e:
+				raise ValueError(f"{path}:{line.lineno}: {e}") from None
+		if pending is not None:
+			self.emit(path, pending[0], self.expand(self.with_hidesets(pending[1])))
+		if conditions:
+			raise ValueError(f"{path}: Unterminated #if")
+		self.include_depth -= 1
+	
+	def process_directive(self, line, path, conditions, active):
+		directive, tokens = line.directive, line.tokens
+		if directive in ("if", "ifdef", "ifndef"):
+			if not active:
+				taken = False
+			elif directive == "if":
+				taken = self.eval_condition(tokens)
+			else:
+				taken = (self.get_name(tokens) in self.macros) == (directive == "ifdef")
+			conditions.append([taken, taken, active])
+		elif directive in ("elif", "else"):
+			if not conditions:
+				raise ValueError(f"#{directive} without #if")
+			condition = conditions[-1]
+			if condition[1] or not condition[2]:
+				condition[0] = False
+			elif directive == "else":
+				condition[0] = condition[1] = True
+			else:
+				condition[0] = condition[1] = self.eval_condition(tokens)
+		elif directive == "endif":
+			if not conditions:
+				raise ValueError("#endif without #if")
+			conditions.pop()
+		elif not active:
+			pass
+		elif directive == "include":
+			self.process_file(self.find_include(tokens, path))
+		elif directive == "define":
+			self.define(tokens)
+		elif directive == "undef":
+			self.macros.pop(self.get_name(tokens), None)
+		elif directive == "pragma":
+			if tokens == ["once"]:
+				self.once.add(os.path.abspath(path))
+			else:
+				self.emit(
+					path, line.lineno, [("#pragma ", frozenset())] + self.with_hidesets(tokens)
+				)
+		elif directive == "error":
+			raise ValueError("#error " + "".join(tokens))
+		elif directive not in ("", "line", "warning", "ident"):
+			raise ValueError(f"Unknown directive #{directive}")
+	
+	def emit(self, path, lineno, tokens):
+		text = join_tokens([token for token, _ in tokens])
+		if not text.strip():
+			return
+		if path != self.path or not 0 <= lineno - self.lineno <= 8:
+			self.mark(path, lineno)
+		else:
+			#blank lines are shorter than a line marker for small gaps
+			self.out.extend([""] * (lineno - self.lineno))
+		self.out.append(text)
+		self.lineno = lineno + 1
+	
+	def mark(self, path, lineno):
+		self.out.append(f'# {lineno} "{path}"'.replace("\\", "\\\\"))
+		self.path = path
+		self.lineno = lineno
+	
+	def get_name(self, tokens):
+		if not tokens or not is_identifier(tokens[0]):
+			raise ValueError("Expected a macro name")
+		return tokens[0]
+	
+	def find_include(self, tokens, path):
+		if tokens and tokens[0][0] not in "\"<":
+			expanded = self.expand(self.with_hidesets(tokens))
+			tokens = tokenize(join_tokens([token for token, _ in expanded]).strip())
+		text = "".join(tokens)
+		if text.startswith('"') and text.endswith('"'):
+			name = text[1:-1]
+			search = [os.path.dirname(path)] + self.include_paths
+		elif text.startswith("<") and text.endswith(">"):
+			name = text[1:-1]
+			search = self.include_paths
+		else:
+			raise ValueError("Expected \"file\" or <file> after #include")
+		for directory in search:
+			candidate = os.path.join(directory, name)
+			if os.path.isfile(candidate):
+				return candidate
+		raise ValueError(f"{name}: No such file or directory")
+	
+	def define(self, tokens):
+		name = self.get_name(tokens)
+		if len(tokens) > 1 and tokens[1] == "(":
+			end = tokens.index(")")
+			params = [token for token in tokens[2:end] if not is_space(token) and token != ","]
+			variadic = bool(params) and params[-1] == "..."
+			if variadic:
+				params[-1] = "__VA_ARGS__"
+			macro = Macro(name, params, self.normalize(tokens[end + 1:]), variadic)
+		else:
+			macro = Macro(name, None, self.normalize(tokens[1:]))
+		self.macros[name] = macro
+	
+	def normalize(self, tokens):
+		""" a macro body, with surrounding whitespace removed and other whitespace collapsed """
+		return [" " if is_space(token) else token for token in strip_spaces(tokens)]
+	
+	def with_hidesets(self, tokens):
+		""" pair tokens with the macros that mustn't be expanded in them """
+		hideset = frozenset()
+		return [(token, hideset) for token in tokens]
+	
+	def expand(self, tokens, partial=False):
+		"""
+		macro expand (token, hideset) pairs, rescanning each expansion with the tokens after it
+		if partial, returns None when a function-like macro's arguments continue on the next line
+		"""
+		out = []
+		i = 0
+		while i < len(tokens):
+			token, hideset = tokens[i]
+			macro = self.macros.get(token)
+			if macro is None and token in ("__FILE__", "__LINE__"):
+				path, lineno = self.location
+				token = '"' + path.replace("\\",
+					"\\\\") + '"' if token == "__FILE__" else str(lineno)
+				tokens[i] = (token, hideset)
+			if macro is None or token in hideset:
+				out.append(tokens[i])
+				i += 1
+				continue
+			if macro.params is None:
+				body = [(body_token, hideset | {token}) for body_token in macro.body]
+				tokens[i:i + 1] = body
+				continue
+			start = i + 1
+			while start < len(tokens) and is_space(tokens[start][0]):
+				start += 1
+			args = None
+			if start < len(tokens) and tokens[start][0] == "(":
+				args, end = self.collect_args(tokens, start)
+			if args is None:
+				if partial and (start == len(tokens) or tokens[start][0] == "("):
+					#the arguments may continue on the next line
+					return None
+				out.append(tokens[i])
+				i += 1
+				continue
+			hideset = (hideset & tokens[end][1]) | {token}
+			tokens[i:end + 1] = self.substitute(macro, args, hideset)
+		return out
+	
+	def collect_args(self, tokens, start):
+		""" the arguments of the call starting at the ( at start and the offset of its ) """
+		args = [[]]
+		depth = 0
+		for i in range(start + 1, len(tokens)):
+			token = tokens[i][0]
+			if token == "(":
+				depth += 1
+			elif token == ")":
+				if depth == 0:
+					return [strip_spaces_pairs(arg) for arg in args], i
+				depth -= 1
+			elif token == "," and depth == 0:
+				args.append([])
+				continue
+			args[-1].append(tokens[i])
+		return None, None
+	
+	def substitute(self, macro, args, hideset):
+		params = macro.params
+		if args == [[]] and not params:
+			args = []
+		if macro.variadic and len(args) >= len(params):
+			rest = args[len(params) - 1:]
+			joined = rest[0]
+			for arg in rest[1:]:
+				joined = joined + [(",", frozenset())] + arg
+			args = args[:len(params) - 1] + [joined]
+		elif macro.variadic and len(args) == len(params) - 1:
+			args = args + [[]]
+		if len(args) != len(params):
+			raise ValueError(f"{macro.name} takes {len(params)} arguments, got {len(args)}")
+		args = dict(zip(params, args))
+		body = macro.body
+		out = []
+		i = 0
+		while i < len(body):
+			token = body[i]
+			if token == "#" and i + 2 <= len(body):
+				j = i + 1
+				while j < len(body) and is_space(body[j]):
+					j += 1
+				if j < len(body) and body[j] in args:
+					out.append((stringize(args[body[j]]), hideset))
+					i = j + 1
+					continue
+			if token == "##":
+				while out and is_space(out[-1][0]):
+					out.pop()
+				j = i + 1
+				while j < len(body) and is_space(body[j]):
+					j += 1
+				if j == len(body):
+					break
+				right = args[body[j]] if body[j] in args else [(body[j], hideset)]
+				right = [(text, hideset) for text, _ in right]
+				if out and right:
+					out[-1] = (out[-1][0] + right[0][0], hideset)
+					right = right[1:]
+				out.extend(right)
+				i = j + 1
+				continue
+			if token in args:
+				next_token = next((t for t in body[i + 1:] if not is_space(t)), None)
+				if next_token == "##":
+					out.extend((text, hideset) for text, _ in args[token])
+				else:
+					out.extend(self.expand(list(args[token])))
+			else:
+				out.append((token, hideset))
+			i += 1
+		return [(token, token_hideset | hideset) for token, token_hideset in out]
+	
+	def eval_condition(self, tokens):
+		#replace defined X and defined(X) before the other macros are expanded
+		replaced = []
+		i = 0
+		tokens = [token for token in tokens if not is_space(token)]
+		while i < len(tokens):
+			if tokens[i] == "defined":
+				if tokens[i + 1:i + 2] == ["("]:
+					name, i = self.get_name(tokens[i + 2:]), i + 4
+				else:
+					name, i = self.get_name(tokens[i + 1:]), i + 2
+				replaced.append("1" if name in self.macros else "0")
+			else:
+				replaced.append(tokens[i])
+				i += 1
+		expanded = [token for token, _ in self.expand(self.with_hidesets(replaced))]
+		#identifiers left after expansion are 0
+		expanded = [
+			"0" if is_identifier(token) else token for token in expanded if not is_space(token)
+		]
+		if not expanded:
+			raise ValueError("#if with no expression")
+		parser = ExpressionParser(expanded)
+		value = parser.parse()
+		if parser.pos != len(expanded):
+			raise ValueError(f"Unexpected {expanded[parser.pos]!r} in #if")
+		return value != 0
+
+def join_tokens(tokens):
+	""" concatenate tokens, separating ones that would otherwise be lexed as one token """
+	parts = []
+	prev = None
+	for token in tokens:
+		if prev is not None and not is_space(token) and not is_space(prev):
+			if token_re.match(prev + token).end() > len(prev):
+				parts.append(" ")
+		parts.append(token)
+		prev = token
+	return "".join(parts)
+
+def strip_spaces_pairs(tokens):
+	start = 0
+	end = len(tokens)
+	while start < end and is_space(tokens[start][0]):
+		start += 1
+	while end > start and is_space(tokens[end - 1][0]):
+		end -= 1
+	return tokens[start:end]
+
+def stringize(tokens):
+	parts = []
+	for token, _ in strip_spaces_pairs(tokens):
+		if is_space(token):
+			if parts and parts[-1] != " ":
+				parts.append(" ")
+		elif token[0] in "\"'" or token[:2] in ('L"', "L'"):
+			parts.append(token.replace("\\", "\\\\").replace('"', '\\"'))
+		else:
+			parts.append(token)
+	return '"' + "".join(parts) + '"'
+
+class ExpressionParser():
+	""" evaluates the integer constant expression of an #if """
+	def __init__(self, tokens):
+		self.tokens = tokens
+		self.pos = 0
+	
+	def peek(self):
+		return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+	
+	def take(self, expected=None):
+		token = self.peek()
+		if token is None or (expected is not None and token != expected):
+			raise ValueError(f"Expected {expected or 'an expression'} in #if")
+		self.pos += 1
+		return token
+	
+	def parse(self):
+		cond = self.parse_binary(1)
+		if self.peek() != "?":
+			return cond
+		self.take("?")
+		if_true = self.parse()
+		self.take(":")
+		if_false = self.parse()
+		return if_true if cond else if_false
+	
+	def parse_binary(self, min_precedence):
+		left = self.parse_unary()
+		while binary_precedence.get(self.peek(), 0) >= min_precedence:
+			op = self.take()
+			right = self.parse_binary(binary_precedence[op] + 1)
+			left = eval_binary(op, left, right)
+		return left
+	
+	def parse_unary(self):
+		token = self.take()
+		if token == "(":
+			value = self.parse()
+			self.take(")")
+			return value
+		elif token == "!":
+			return int(not self.parse_unary())
+		elif token == "~":
+			return ~self.parse_unary()
+		elif token == "-":
+			return -self.parse_unary()
+		elif token == "+":
+			return self.parse_unary()
+		try:
+			return parse_int(token)
+		except ValueError:
+			raise ValueError(f"Unexpected {token!r} in #if") from None
+
+def eval_binary(op, left, right):
+	if op in ("/", "%"):
+		if right == 0:
+			raise ValueError("Division by zero in #if")
+		#C division truncates towards zero
+		quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+		return quotient if op == "/" else left - quotient * right
+	return {
+		"||": lambda: int(bool(left or right)),
+		"&&": lambda: int(bool(left and right)),
+		"|": lambda: left | right,
+		"^": lambda: left ^ right,
+		"&": lambda: left & right,
+		"==": lambda: int(left == right),
+		"!=": lambda: int(left != right),
+		"<": lambda: int(left < right),
+		">": lambda: int(left > right),
+		"<=": lambda: int(left <= right),
+		">=": lambda: int(left >= right),
+		"<<": lambda: left << right,
+		">>": lambda: left >> right,
+		"+": lambda: left + right,
+		"-": lambda: left - right,
+		"*": lambda: left * right
+	}[op]()
+
+def parse_cpp_args(cpp_args):
+	""" include paths and defines from the -I and -D options understood by cpp """
+	include_paths = []
+	defines = {}
+	args = iter(cpp_args)
+	for arg in args:
+		if arg in ("-I", "-D", "-U"):
+			option, value = arg, next(args)
+		elif arg[:2] in ("-I", "-D", "-U"):
+			option, value = arg[:2], arg[2:]
+		else:
+			raise ValueError(f"Unsupported preprocessor option {arg}")
+		if option == "-I":
+			include_paths.append(value)
+		elif option == "-D":
+			name, _, body = value.partition("=")
+			defines[name] = body or "1"
+		else:
+			defines.pop(value, None)
+	return include_paths, defines
+
+def preprocess_file(filename, cpp_args=()):
+	""" drop-in replacement for pycparser.preprocess_file that doesn't run cpp """
+	include_paths, defines = parse_cpp_args(cpp_args)
+	return Preprocessor(include_paths, defines).preprocess(filename)
+
+preprocessors = {"cpp": pycparser.preprocess_file, "builtin": preprocess_file}
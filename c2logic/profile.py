@@ -0,0 +1,53 @@
+import json
+from dataclasses import dataclass, field
+
+@dataclass
+class Profile():
+	"""
+	how many times each probe of an instrumented program ran
+	probes are keyed like main:12:5:then, the function, line and column of the statement they're in
+	and which part of it they count
+	"""
+	counts: dict = field(default_factory=dict)
+	
+	def get(self, key):
+		""" the count of the probe, or None if the profile doesn't cover it """
+		return self.counts.get(key)
+	
+	def runs(self):
+		""" how many times main was run """
+		return sum(
+			count for key, count in self.counts.items()
+			if key.startswith("main:") and key.endswith(":entry")
+		)
+	
+	def is_hot(self, key):
+		""" whether the probe ran more than once per run of main """
+		count = self.get(key)
+		return count is not None and count > max(self.runs(), 1)
+	
+	@classmethod
+	def load(cls, path):
+		with open(path) as f:
+			return cls(json.load(f))
+	
+	def save(self, path):
+		with open(path, "w") as f:
+			json.dump(self.counts, f, indent="\t", sort_keys=True)
+
+def from_memory(probes, memory):
+	""" the Profile of a run, from the probes of the Compiler and the memory it wrote counts to """
+	return Profile({key: int(memory.get(i, 0)) for i, key in enumerate(probes)})
+
+def collect(filename, runs=1, max_instructions=1000000, memory="cell2", **options):
+	"""
+	profile filename by compiling it with probes writing to memory and running it in the emulator
+	options are passed to Compiler
+	"""
+	from .compiler import Compiler
+	from .emulator import Emulator
+	compiler = Compiler(instrument=memory, **options)
+	emulator = Emulator(compiler.compile(filename))
+	for _ in range(runs):
+		emulator.run(max_instructions)
+	return from_memory(compiler.probes, emulator.get_building(memory).memory)
@@ -0,0 +1,156 @@
+import math
+
+from .consts import binary_ops, condition_ops, unary_ops
+from .ops import eval_binary_op, eval_condition, eval_unary_op, parse_number
+from .flow import (
+	defs, dest_types, is_retaddr, is_temp, jump_targets, liveness, local_names, param_names,
+	remove_instructions, rename, uses
+)
+from .instructions import (
+	BinaryOp, ComputedJump, JumpCondition, RawAsm, RelativeJump, Set, UnaryOp
+)
+
+#ops whose result isn't determined by their operands
+impure_ops = {"rand"}
+
+def literal_value(var):
+	if not isinstance(var, str):
+		return None
+	return parse_number(var)
+
+def format_literal(val: float):
+	if not math.isfinite(val):
+		return None
+	if val == int(val) and abs(val) < 2**53:
+		return str(int(val))
+	return repr(val)
+
+def fold_binary_op(op: str, left: str, right: str):
+	""" the literal result of op on literal operands, or None if it isn't known at compile time """
+	left_val, right_val = literal_value(left), literal_value(right)
+	if left_val is None or right_val is None or op in impure_ops or op not in binary_ops:
+		return None
+	return format_literal(eval_binary_op(binary_ops[op], left_val, right_val))
+
+def fold_unary_op(op: str, src: str):
+	val = literal_value(src)
+	if val is None or op in impure_ops or op not in unary_ops:
+		return None
+	return format_literal(eval_unary_op(unary_ops[op], val))
+
+def fold_condition(cond: JumpCondition):
+	left_val, right_val = literal_value(cond.left), literal_value(cond.right)
+	if left_val is None or right_val is None:
+		return None
+	return eval_condition(condition_ops[cond.op], left_val, right_val)
+
+def fold(instruction):
+	""" replace an op on literals with a set of its result """
+	if isinstance(instruction, BinaryOp):
+		folded = fold_binary_op(instruction.op, instruction.left, instruction.right)
+	elif isinstance(instruction, UnaryOp):
+		folded = fold_unary_op(instruction.op, instruction.src)
+	else:
+		return instruction
+	if folded is None:
+		return instruction
+	return Set(instruction.dest, folded).replaces(instruction)
+
+def propagate_constants(function):
+	"""
+	substitute variables holding literals within basic blocks and into variables only ever assigned
+	one literal, fold the resulting constant ops and jumps
+	returns whether anything changed
+	"""
+	if any(isinstance(instruction, RawAsm) for instruction in function.instructions):
+		return False
+	changed = propagate_single_assignments(function)
+	instructions = function.instructions
+	targets = jump_targets(function)
+	known = {}
+	to_remove = set()
+	for i, instruction in enumerate(instructions):
+		if i in targets:
+			known = {}
+		if is_retaddr(instruction):
+			continue
+		instruction_uses = uses(instruction)
+		if instruction_uses is None:  # calls, returns, end
+			known = {}
+			continue
+		if instruction_uses & known.keys():
+			rename(instruction, known, dests=False)
+			changed = True
+		new_instruction = fold(instruction)
+		if new_instruction is not instruction:
+			instructions[i] = instruction = new_instruction
+			changed = True
+		if isinstance(instruction, ComputedJump):
+			index = literal_value(instruction.index)
+			if index is not None and index == int(index) and 0 <= index < instruction.size:
+				instructions[i] = instruction = RelativeJump(
+					i + 1 + int(index), JumpCondition.always
+				).replaces(instruction)
+				changed = True
+		if isinstance(instruction, RelativeJump):
+			taken = fold_condition(instruction.cond)
+			if taken is None or instruction.cond == JumpCondition.always:
+				pass
+			elif taken:
+				instruction.cond = JumpCondition.always
+				changed = True
+			else:
+				to_remove.add(i)
+		for dest in defs(instruction):
+			known.pop(dest, None)
+			if isinstance(instruction, Set) and not dest.startswith("@"):
+				if literal_value(instruction.src) is not None:
+					known[dest] = instruction.src
+	removed = remove_instructions(function, to_remove)
+	return changed or removed
+
+def propagate_single_assignments(function):
+	""" replace variables that are only ever assigned one literal with that literal """
+	instructions = function.instructions
+	tracked = local_names(function) - param_names(function)
+	for instruction in instructions:
+		tracked |= {var for var in defs(instruction) if is_temp(var)}
+	live_in, _ = liveness(function, tracked)
+	assignments = {}
+	for i, instruction in enumerate(instructions):
+		for dest in defs(instruction) & tracked:
+			assignments.setdefault(dest, []).append(i)
+	#a variable that isn't live on entry is always written before being read
+	constants = {}
+	for var, offsets in assignments.items():
+		if len(offsets) != 1 or var in live_in[0]:
+			continue
+		instruction = instructions[offsets[0]]
+		if isinstance(instruction, Set) and literal_value(instruction.src) is not None:
+			constants[var] = instruction.src
+	changed = False
+	for instruction in instructions:
+		instruction_uses = uses(instruction)
+		if instruction_uses and instruction_uses & constants.keys():
+			rename(instruction, constants, dests=False)
+			changed = True
+	return changed
+
+def remove_dead_stores(function):
+	""" remove writes to locals and temporaries that are never read afterwards """
+	instructions = function.instructions
+	if any(isinstance(instruction, RawAsm) for instruction in instructions):
+		return False
+	tracked = local_names(function)
+	for instruction in instructions:
+		tracked |= {var for var in defs(instruction) if is_temp(var)}
+	live_in, live_out = liveness(function, tracked)
+	#locals read before being written keep their value for the next call
+	tracked -= live_in[0] - param_names(function)
+	to_remove = {
+		i
+		for i, instruction in enumerate(instructions)
+		if isinstance(instruction, dest_types) and not is_retaddr(instruction) and
+		instruction.dest in tracked and instruction.dest not in live_out[i]
+	}
+	return remove_instructions(function, to_remove)
@@ -0,0 +1,168 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+
+#used where unix sockets aren't available
+default_port = 7235
+
+def get_address():
+	""" where the server listens by default, C2LOGIC_SERVER overrides it """
+	address = os.environ.get("C2LOGIC_SERVER")
+	if address:
+		return address
+	if not hasattr(socket, "AF_UNIX"):
+		return f"127.0.0.1:{default_port}"
+	runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+	return os.path.join(runtime_dir, f"c2logic-{os.getuid()}.sock")
+
+def is_tcp(address):
+	host, _, port = address.rpartition(":")
+	return bool(host) and port.isdigit()
+
+def connect(address):
+	if is_tcp(address):
+		host, _, port = address.rpartition(":")
+		return socket.create_connection((host, int(port)))
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(address)
+	except OSError:
+		sock.close()
+		raise
+	return sock
+
+def listen(address):
+	if is_tcp(address):
+		host, _, port = address.rpartition(":")
+		return socket.create_server((host, int(port)))
+	if os.path.exists(address):
+		try:
+			connect(address).close()
+		except OSError:  # left behind by a server that didn't exit cleanly
+			os.remove(address)
+		else:
+			raise ValueError(f"A server is already listening on {address}")
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	#other users mustn't be able to compile, and so write files, as this one
+	umask = os.umask(0o177)
+	try:
+		sock.bind(address)
+	finally:
+		os.umask(umask)
+	sock.listen()
+	return sock
+
+def request(args, cwd=None, address=None):
+	"""
+	run the c2logic command with args on the server at address
+	returns a dict with its stdout, stderr and exit status
+	"""
+	with connect(address or get_address()) as sock:
+		with sock.makefile("rw", encoding="utf-8") as f:
+			f.write(json.dumps({"args": args, "cwd": cwd or os.getcwd()}) + "\n")
+			f.flush()
+			line = f.readline()
+	if not line:
+		raise ConnectionError("The server closed the connection without responding")
+	return json.loads(line)
+
+def handle(message):
+	""" run the c2logic command a request asks for and capture its output """
+	from .compiler import main
+	args = message["args"]
+	if "--watch" in args:
+		return {"stdout": "", "stderr": "--watch isn't supported through the server\n", "status": 2}
+	stdout = io.StringIO()
+	stderr = io.StringIO()
+	status = 0
+	cwd = os.getcwd()
+	try:
+		os.chdir(message.get("cwd", cwd))
+		with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+			main(args)
+	except SystemExit as e:
+		if isinstance(e.code, str):
+			print(e.code, file=stderr)
+		status = e.code if isinstance(e.code, int) else int(e.code is not None)
+	except Exception:  #pylint: disable=broad-except
+		#one bad request shouldn't bring down the server
+		traceback.print_exc(file=stderr)
+		status = 1
+	finally:
+		os.chdir(cwd)
+	return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "status": status}
+
+def serve_file(f):
+	""" answer each line of requests read from f with a line written to it """
+	for line in f:
+		if not line.strip():
+			continue
+		try:
+			response = handle(json.loads(line))
+		except (ValueError, KeyError, TypeError) as e:  # malformed request
+			response = {"stdout": "", "stderr": f"Invalid request: {e}\n", "status": 2}
+		f.write(json.dumps(response) + "\n")
+		f.flush()
+
+def serve(address=None):
+	""" answer requests on address until interrupted """
+	from .cache import get_parser
+	#load pycparser's tables before the first request
+	get_parser()
+	address = address or get_address()
+	with listen(address) as server:
+		try:
+			while True:
+				conn, _ = server.accept()
+				with conn, conn.makefile("rw", encoding="utf-8") as f:
+					try:
+						serve_file(f)
+					except OSError:  # the client went away
+						pass
+		finally:
+			if not is_tcp(address) and os.path.exists(address):
+				os.remove(address)
+
+class StdioFile():
+	""" stdin and stdout as one file for serve_file """
+	def __iter__(self):
+		return iter(sys.stdin)
+	
+	def write(self, text):
+		sys.stdout.write(text)
+	
+	def flush(self):
+		sys.stdout.flush()
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(
+		description="Keep the compiler loaded and run c2logic commands sent by c2logic-client."
+	)
+	parser.add_argument(
+		"--address",
+		help="unix socket path or host:port to listen on, defaults to $C2LOGIC_SERVER or "
+		f"$XDG_RUNTIME_DIR/c2logic-<uid>.sock (127.0.0.1:{default_port} without unix sockets)"
+	)
+	parser.add_argument(
+		"--stdio",
+		action="store_true",
+		help="read requests from stdin and write responses to stdout instead of listening"
+	)
+	args = parser.parse_args()
+	try:
+		if args.stdio:
+			from .cache import get_parser
+			get_parser()
+			serve_file(StdioFile())
+		else:
+			serve(args.address)
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
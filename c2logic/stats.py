@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+@dataclass
+class Stats():
+	""" where a compile spent its time and how each pass changed the size of each function """
+	#seconds spent in each phase, in the order they ran
+	timings: dict = field(default_factory=dict)
+	#function name -> {stage: instruction count}
+	sizes: dict = field(default_factory=dict)
+	#instructions moving a value through __rax that were avoided
+	indirections_avoided: int = 0
+	#instructions in the linked program
+	instructions: int = 0
+	#problems with the program that don't stop it from compiling
+	warnings: list = field(default_factory=list)
+	
+	@contextmanager
+	def time(self, phase):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start
+	
+	def record(self, function, stage):
+		self.sizes.setdefault(function.name, {})[stage] = len(function.instructions)
+	
+	def record_all(self, functions, stage):
+		for function in functions.values():
+			self.record(function, stage)
+	
+	def report(self, max_instructions=1000):
+		lines = [f"{'phase':<28} {'ms':>9}"]
+		for phase, seconds in self.timings.items():
+			lines.append(f"{phase:<28} {seconds * 1000:>9.2f}")
+		lines.append(f"{'total':<28} {sum(self.timings.values()) * 1000:>9.2f}")
+		stages = []
+		for sizes in self.sizes.values():
+			for stage in sizes:
+				if stage not in stages:
+					stages.append(stage)
+		if stages:
+			lines.append("")
+			lines.append(f"{'function':<20} " + " ".join(f"{stage:>11}" for stage in stages))
+			for name, sizes in self.sizes.items():
+				counts = (str(sizes.get(stage, "-")) for stage in stages)
+				lines.append(f"{name:<20} " + " ".join(f"{count:>11}" for count in counts))
+		lines.append("")
+		lines.append(f"__rax indirections avoided: {self.indirections_avoided}")
+		lines.append(f"instructions: {self.instructions} of {max_instructions}")
+		return "\n".join(lines)
@@ -0,0 +1,22 @@
+#include "c2logic/builtins.h"
+/*expected output:
+0123
+43210
+*/
+extern struct MindustryObject message1;
+void main(void) {
+	int i = 0;
+	for (; i < 4;) {
+		printd(i);
+		i++;
+	}
+	print("\n");
+	for (;; i--) {
+		printd(i);
+		if (i == 0) {
+			break;
+		}
+	}
+	print("\n");
+	printflush(message1);
+}
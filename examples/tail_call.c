@@ -0,0 +1,24 @@
+#include "c2logic/builtins.h"
+/*expected output:
+6
+3628800
+*/
+extern struct MindustryObject message1;
+double gcd(double a, double b) {
+	if (b == 0) {
+		return a;
+	}
+	return gcd(b, a % b);
+}
+double factorial(double n, double acc) {
+	if (n < 2) {
+		return acc;
+	}
+	return factorial(n - 1, acc * n);
+}
+void main(void) {
+	printd(gcd(48, 18));
+	print("\n");
+	printd(factorial(10, 1));
+	printflush(message1);
+}
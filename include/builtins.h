@@ -29,6 +29,9 @@ void drawflush(struct MindustryObject display);
 
 void end();
 
+// hint that exp is usually c, so the branches it's a condition of are laid out for that case
+double __builtin_expect(double exp, double c);
+
 // builtin binary operators
 double pow(double x, double y);
 double max(double x, double y);
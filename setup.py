@@ -13,6 +13,11 @@ setuptools.setup(
 	url="https://github.com/SuperStormer/c2logic",
 	project_urls={"Source Code": "https://github.com/SuperStormer/c2logic"},
 	headers=["include/builtins.h"],
-	entry_points={"console_scripts": ["c2logic=c2logic.compiler:main"]},
+	entry_points={
+		"console_scripts": [
+			"c2logic=c2logic.compiler:main", "c2logic-emulate=c2logic.emulator:main",
+			"c2logic-server=c2logic.server:main", "c2logic-client=c2logic.client:main"
+		]
+	},
 	install_requires=["pycparser~=2.20"]
 )
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+from c2logic.compiler import Compiler
+from c2logic.cost import CostModel
+
+straight_line = """#include "c2logic/builtins.h"
+extern struct MindustryObject message1;
+double f(double x) {
+	return x * 2 + 1;
+}
+void main(void) {
+	double a = f(3);
+	print(a);
+	print(a + 1);
+	printflush(message1);
+}
+"""
+
+class CostTest(unittest.TestCase):
+	def compile(self, source, opt_level):
+		with tempfile.TemporaryDirectory() as directory:
+			filename = os.path.join(directory, "program.c")
+			with open(filename, "w") as f:
+				f.write(source)
+			compiler = Compiler(opt_level, preprocessor="builtin")
+			compiler.compile(filename)
+		return compiler.functions
+	
+	def test_straight_line_call(self):
+		""" code without branches runs every instruction once, and the callee's once per call """
+		functions = self.compile(straight_line, 1)
+		model = CostModel(functions)
+		self.assertEqual(model.worst_case("f"), (len(functions["f"].instructions), False))
+		self.assertEqual(
+			model.worst_case("main"),
+			(len(functions["main"].instructions) + len(functions["f"].instructions), False)
+		)
+
+if __name__ == "__main__":
+	unittest.main()
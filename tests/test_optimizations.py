@@ -0,0 +1,358 @@
+import os
+import tempfile
+
+import pytest
+
+from c2logic.compiler import Compiler
+from c2logic.emulator import Emulator
+
+header = """#include "c2logic/builtins.h"
+extern struct MindustryObject message1;
+"""
+
+def run(source, opt_level):
+	""" compile source at opt_level and run it once, returns what it printed to message1 """
+	with tempfile.TemporaryDirectory() as directory:
+		filename = os.path.join(directory, "program.c")
+		with open(filename, "w") as f:
+			f.write(header + source)
+		code = Compiler(opt_level, preprocessor="builtin").compile(filename)
+	emulator = Emulator(code)
+	emulator.run()
+	return emulator.messages().get("message1")
+
+#every level, so each pass is checked against the unoptimized output
+opt_levels = [0, 1, 2, 3, 4, "s"]
+
+nested_if_return = """
+double f(double a, double b) {
+	if (a) {
+		if (b) return 1;
+	} else {
+		return 2;
+	}
+	return 3;
+}
+void main(void) {
+	printd(f(1, 0));
+	printd(f(1, 1));
+	printd(f(0, 1));
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", [0, 1, 4, "s"])
+def test_nested_if_return(opt_level):
+	""" an inner if ending after the return of the then body doesn't fall into the else body """
+	assert run(nested_if_return, opt_level) == ["312"]
+
+sensor_after_enable = """
+extern struct MindustryObject conveyor1;
+void main(void) {
+	double a = sensor(conveyor1, "enabled");
+	enable(conveyor1, 0);
+	double b = sensor(conveyor1, "enabled");
+	printd(a);
+	printd(b);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", [1, 4, "s"])
+def test_sensor_after_enable(opt_level):
+	""" sensing again after acting on the building reads the new value """
+	assert run(sensor_after_enable, opt_level) == ["10"]
+
+inf_nan_variables = """
+double inf;
+double nan;
+void main(void) {
+	inf = 2;
+	nan = 3;
+	printd(inf > 5);
+	printd(nan == nan);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", [0, 1, 4, "s"])
+def test_inf_nan_variables(opt_level):
+	""" variables named like the float special values aren't folded as literals """
+	assert run(inf_nan_variables, opt_level) == ["01"]
+
+non_integer_switch = """
+double g(double x) {
+	switch (x) {
+	case 0: return 10;
+	case 1: return 11;
+	case 2: return 12;
+	case 3: return 13;
+	case 5: return 15;
+	default: return 0;
+	}
+}
+void main(void) {
+	printd(g(1.5));
+	print(",");
+	printd(g(-0.5));
+	print(",");
+	printd(g(4.5));
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", [0, 1, 4, "s"])
+def test_non_integer_switch(opt_level):
+	""" the jump table and the binary search -Os picks instead both truncate the value """
+	assert run(non_integer_switch, opt_level) == ["11,10,0"]
+
+coalesced_locals = """
+double mix(double a, double b, double c) {
+	double x = a + b;
+	double y = x * c;
+	double z = y - a;
+	double w = z / 2;
+	return w + x;
+}
+void main(void) {
+	double i;
+	double s = 0;
+	double t = 1;
+	for (i = 0; i < 4; i++) {
+		double u = s + i;
+		double v = u * t;
+		t = s;
+		double m = mix(i, u, 2);
+		s = v + m;
+	}
+	printd(s);
+	print(",");
+	printd(t);
+	printd(mix(1, 2, 3));
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_coalesced_locals(opt_level):
+	""" locals and temporaries sharing a variable don't overwrite each other while live """
+	assert run(coalesced_locals, opt_level) == ["98,147"]
+
+folded_constants = """
+double limit;
+void main(void) {
+	double a = 7;
+	double b = a * 3 - 1;
+	double c = -7 % 3;
+	double d = (16 | 3) & 29;
+	limit = 5;
+	if (b > 19) {
+		a = a + 1;
+	}
+	printd(a);
+	print(",");
+	printd(b);
+	print(",");
+	printd(c);
+	print(",");
+	printd(d);
+	print(",");
+	printd(floor(-2.5) + max(limit, 2));
+	print(",");
+	printd(10 / 4);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_folded_constants(opt_level):
+	""" literals folded and propagated at compile time give what mlog computes at run time """
+	assert run(folded_constants, opt_level) == ["8,20,-1,17,2,2.5"]
+
+inlined_functions = """
+double clamp(double v, double lo, double hi) {
+	if (v < lo) return lo;
+	if (v > hi) return hi;
+	return v;
+}
+double scale(double v) {
+	double r = v * 2;
+	v = v + 1;
+	return r + v;
+}
+double once(double n) {
+	double i;
+	double total = 0;
+	for (i = 0; i < n; i++) {
+		double c = clamp(i, 1, 3);
+		total += c;
+	}
+	return total;
+}
+void main(void) {
+	double k = 2;
+	double a = scale(k);
+	printd(a);
+	printd(k);
+	print(",");
+	double b = clamp(-4, 0, 5);
+	printd(b);
+	b = clamp(9, 0, 5);
+	printd(b);
+	print(",");
+	double t = once(6);
+	printd(t);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_inlined_functions(opt_level):
+	""" inlined functions return early, keep their locals apart and don't change the caller's args """
+	assert run(inlined_functions, opt_level) == ["72,05,13"]
+
+self_tail_calls = """
+double gcd(double a, double b) {
+	if (b == 0) return a;
+	return gcd(b, a % b);
+}
+double sum_to(double n, double acc) {
+	if (n <= 0) return acc;
+	return sum_to(n - 1, acc + n);
+}
+double rotate(double a, double b, double c, double n) {
+	if (n == 0) return a * 100 + b * 10 + c;
+	return rotate(c, a, b, n - 1);
+}
+void main(void) {
+	double g = gcd(84, 36);
+	printd(g);
+	print(",");
+	double s = sum_to(50, 0);
+	printd(s);
+	print(",");
+	double r = rotate(1, 2, 3, 4);
+	printd(r);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_self_tail_calls(opt_level):
+	""" tail calls reassign parameters that later arguments read through temporaries """
+	assert run(self_tail_calls, opt_level) == ["12,1275,312"]
+
+switches = """
+double dense(double x) {
+	double r = 0;
+	switch (x) {
+	case 0: r = 10; break;
+	case 1: r = 11;
+	case 2: r += 12; break;
+	default: r = -1; break;
+	case 3: return 99;
+	case 5: r = 15;
+	}
+	return r;
+}
+double sparse(double x) {
+	switch (x) {
+	case 100: return 1;
+	case -5: return 2;
+	case 7: return 3;
+	case 1000: return 4;
+	case 3: return 5;
+	}
+	return 0;
+}
+void main(void) {
+	double i;
+	for (i = -1; i < 7; i++) {
+		if (i == 4) continue;
+		double d = dense(i);
+		printd(d);
+		print(" ");
+	}
+	print(",");
+	for (i = -6; i < 1001; i++) {
+		double s = sparse(i);
+		if (s != 0) printd(s);
+	}
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_switches(opt_level):
+	""" jump tables and binary searches fall through, break and reach default like C """
+	assert run(switches, opt_level) == ["-1 10 23 12 99 15 -1 ,25314"]
+
+short_circuits = """
+double calls;
+double touch(double v) {
+	calls++;
+	return v;
+}
+void main(void) {
+	double a = 0;
+	double b = 3;
+	double x = touch(a) && touch(b);
+	printd(x);
+	printd(calls);
+	x = touch(b) || touch(a);
+	printd(x);
+	printd(calls);
+	print(",");
+	x = b && !a;
+	printd(x);
+	x = (a || b > 2) && (b < 2 || a == 0);
+	printd(x);
+	x = !(a && b) || (a || 0);
+	printd(x);
+	print(",");
+	double i;
+	double n = 0;
+	for (i = 0; i < 10 && n < 4; i++) {
+		if (i == 3 || (i > 5 && i != 8)) n++;
+	}
+	printd(i);
+	printd(n);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_short_circuits(opt_level):
+	""" && and || skip their right operand when the left decides, as conditions and as values """
+	assert run(short_circuits, opt_level) == ["0112,111,104"]
+
+common_subexpressions = """
+extern double time;
+void main(void) {
+	double a;
+	double b;
+	for (a = 1; a < 3; a++) {
+		for (b = 3; b < 5; b++) {
+			double x = a * b + 1;
+			double y = b * a + 1;
+			printd(x);
+			printd(y);
+			a = a + 2;
+			double z = a * b + 1;
+			printd(z);
+			a = a - 2;
+			print(" ");
+		}
+	}
+	print(",");
+	double t0 = time * 2;
+	double t1 = time * 2;
+	printd(t1 > t0);
+	printflush(message1);
+}
+"""
+
+@pytest.mark.parametrize("opt_level", opt_levels)
+def test_common_subexpressions(opt_level):
+	""" values are reused until an operand is written, and ones reading @time never are """
+	assert run(common_subexpressions, opt_level) == ["4410 5513 7713 9917 ,1"]